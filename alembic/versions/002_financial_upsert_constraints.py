@@ -0,0 +1,73 @@
+"""unique constraints backing the financial data upserts
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-16 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+# Tables that reference company_profiles.id and must follow a removed duplicate to the row that is kept
+_PROFILE_CHILD_TABLES = ('financial_reports', 'key_ratio_sets')
+
+def _needs_constraint(inspector, table, columns):
+    """False when the table doesn't exist yet (create_all builds it with the constraint) or already has one."""
+    if not inspector.has_table(table):
+        return False
+    wanted = set(columns)
+    return not (
+        any(set(uc['column_names']) == wanted for uc in inspector.get_unique_constraints(table))
+        or any(ix['unique'] and set(ix['column_names']) == wanted for ix in inspector.get_indexes(table))
+    )
+
+def _delete_duplicates(table, columns):
+    # Keep the most recently refreshed row of each key (highest id on ties / missing refresh times)
+    op.execute(f"""
+        DELETE FROM {table} WHERE id IN (
+            SELECT id FROM (
+                SELECT id, row_number() OVER (
+                    PARTITION BY {', '.join(columns)} ORDER BY last_refreshed DESC NULLS LAST, id DESC) AS rn
+                FROM {table}
+            ) ranked WHERE rn > 1
+        )
+    """)
+
+def upgrade():
+    # ON CONFLICT targets used by FinancialDataService; without a matching unique constraint the upsert is rejected.
+    inspector = sa.inspect(op.get_bind())
+
+    report_key = ['symbol', 'period_of_report_date', 'report_type', 'timeframe']
+    if _needs_constraint(inspector, 'financial_reports', report_key):
+        _delete_duplicates('financial_reports', report_key)
+        op.create_unique_constraint('uq_financial_reports_symbol_period_type_timeframe', 'financial_reports', report_key)
+
+    if _needs_constraint(inspector, 'company_profiles', ['symbol']):
+        # Point rows of the duplicates' children at the kept profile first, so the delete doesn't orphan them
+        for child in _PROFILE_CHILD_TABLES:
+            if inspector.has_table(child):
+                op.execute(f"""
+                    UPDATE {child} AS child SET company_profile_id = ranked.keep_id
+                    FROM (
+                        SELECT id, first_value(id) OVER (
+                            PARTITION BY symbol ORDER BY last_refreshed DESC NULLS LAST, id DESC) AS keep_id
+                        FROM company_profiles
+                    ) ranked
+                    WHERE child.company_profile_id = ranked.id AND ranked.id <> ranked.keep_id
+                """)
+        _delete_duplicates('company_profiles', ['symbol'])
+        op.create_unique_constraint('uq_company_profiles_symbol', 'company_profiles', ['symbol'])
+
+def downgrade():
+    # Only drop what this revision (or create_all, under the same names) added
+    inspector = sa.inspect(op.get_bind())
+    for table, name in (('company_profiles', 'uq_company_profiles_symbol'),
+                        ('financial_reports', 'uq_financial_reports_symbol_period_type_timeframe')):
+        if inspector.has_table(table) and name in {uc['name'] for uc in inspector.get_unique_constraints(table)}:
+            op.drop_constraint(name, table, type_='unique')
@@ -0,0 +1,43 @@
+"""composite index for latest-report reads on financial_reports
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-16 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Matches get_financial_reports_from_db / latest-statement lookups: equality on symbol, timeframe, report_type
+    # then ORDER BY period_of_report_date DESC LIMIT n, served by an index range scan with no sort step.
+    # CONCURRENTLY avoids locking writes on a populated table but can't run inside a transaction.
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('financial_reports'):
+        return # Not created yet: create_all builds it with the index
+    if 'ix_fr_sym_tf_rt_date' in {ix['name'] for ix in inspector.get_indexes('financial_reports')}:
+        return
+    with op.get_context().autocommit_block():
+        op.execute('SET statement_timeout = 0')
+        op.create_index(
+            'ix_fr_sym_tf_rt_date',
+            'financial_reports',
+            ['symbol', 'timeframe', 'report_type', sa.text('period_of_report_date DESC')],
+            unique=False,
+            postgresql_concurrently=True
+        )
+
+def downgrade():
+    # Only drop the index if this revision (or create_all, under the same name) added it
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('financial_reports') or \
+            'ix_fr_sym_tf_rt_date' not in {ix['name'] for ix in inspector.get_indexes('financial_reports')}:
+        return
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_fr_sym_tf_rt_date', table_name='financial_reports', postgresql_concurrently=True)
@@ -0,0 +1,42 @@
+"""unique constraint backing the key ratio set upsert
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-16 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # ON CONFLICT (symbol, date) target of get_or_calculate_and_store_key_ratios; one ratio set per symbol and date.
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('key_ratio_sets'):
+        return # Not created yet: create_all builds it with the constraint
+    wanted = {'symbol', 'date'}
+    if any(set(uc['column_names']) == wanted for uc in inspector.get_unique_constraints('key_ratio_sets')) or \
+            any(ix['unique'] and set(ix['column_names']) == wanted for ix in inspector.get_indexes('key_ratio_sets')):
+        return
+    # Keep the most recently refreshed set per symbol/date (highest id on ties / missing refresh times)
+    op.execute("""
+        DELETE FROM key_ratio_sets WHERE id IN (
+            SELECT id FROM (
+                SELECT id, row_number() OVER (
+                    PARTITION BY symbol, date ORDER BY last_refreshed DESC NULLS LAST, id DESC) AS rn
+                FROM key_ratio_sets
+            ) ranked WHERE rn > 1
+        )
+    """)
+    op.create_unique_constraint('uq_key_ratio_sets_symbol_date', 'key_ratio_sets', ['symbol', 'date'])
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    if inspector.has_table('key_ratio_sets') and \
+            'uq_key_ratio_sets_symbol_date' in {uc['name'] for uc in inspector.get_unique_constraints('key_ratio_sets')}:
+        op.drop_constraint('uq_key_ratio_sets_symbol_date', 'key_ratio_sets', type_='unique')
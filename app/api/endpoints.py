@@ -1,13 +1,17 @@
 # File: app/api/endpoints.py
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List, Dict, Optional, Any
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import functools
 import redis
 from redis.exceptions import RedisError
 import json
 import logging
+import asyncio
 
 # Pydantic Base Model for defining new schemas directly here for now
 from pydantic import BaseModel, Field, EmailStr # Added EmailStr
@@ -121,6 +125,10 @@ except Exception as e:
     logger.critical(f"Failed to initialize MLEngine: {e}", exc_info=True)
     ml_engine = None
 
+# Model inference is CPU-bound and blocking: it runs on its own small pool, so it neither stalls the event loop
+# nor competes with the DB / Alpaca I/O (and long training runs) on the default threadpool.
+_ml_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="ml-inference")
+
 # Initialize Redis Client
 try:
     redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
@@ -218,10 +226,11 @@ async def get_account_info(
     Retrieves Alpaca account information for the authenticated user.
     """
     logger.info(f"Fetching Alpaca account info for user: {current_user.email}")
-    trading_service = get_user_trading_service(current_user)
+    # TradingService talks to Alpaca over blocking HTTP (its constructor included): keep it off the event loop
+    trading_service = await run_in_threadpool(get_user_trading_service, current_user)
     
     try:
-        account_data_dict = trading_service.get_account() # This returns a dict (from _raw)
+        account_data_dict = await run_in_threadpool(trading_service.get_account) # This returns a dict (from _raw)
         if account_data_dict is None:
             raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Failed to retrieve account info from Alpaca.")
         
@@ -256,16 +265,18 @@ async def get_portfolio_info(
     Retrieves Alpaca portfolio information (positions, value) for the authenticated user.
     """
     logger.info(f"Fetching Alpaca portfolio info for user: {current_user.email}")
-    trading_service = get_user_trading_service(current_user)
+    trading_service = await run_in_threadpool(get_user_trading_service, current_user)
     
     try:
-        portfolio_value = trading_service.get_portfolio_value()
-        # Assuming TradingService.get_account() also provides cash balance
-        account_details = trading_service.get_account()
+        # Account (equity + cash) and positions are independent Alpaca calls: run them concurrently
+        account_details, positions_data = await asyncio.gather(
+            run_in_threadpool(trading_service.get_account),
+            run_in_threadpool(trading_service.get_positions), # Returns List[Dict]
+        )
+        # Same as TradingService.get_portfolio_value(), without fetching the account a second time
+        portfolio_value = float(account_details.get('equity', 0.0)) if account_details else None
         cash_balance = float(account_details.get('cash', 0)) if account_details else None
         
-        positions_data = trading_service.get_positions() # Returns List[Dict]
-        
         if portfolio_value is None:
              raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Failed to retrieve portfolio value from Alpaca.")
 
@@ -294,8 +305,8 @@ async def get_db_trade_history(
     """
     logger.info(f"Fetching trade history from DB for user: {current_user.email} (skip={skip}, limit={limit})")
     try:
-        trades = (
-            db.query(Trade)
+        trades = await run_in_threadpool(
+            lambda: db.query(Trade)
             .filter(Trade.user_id == current_user.id)
             .order_by(Trade.timestamp.desc())
             .offset(skip)
@@ -327,9 +338,9 @@ async def train_model_for_symbol(
     status_message = "failed"
     try:
         if model_type == "lstm":
-            success = ml_engine.train_lstm(symbol, epochs=epochs if epochs else 50)
+            success = await run_in_threadpool(ml_engine.train_lstm, symbol, epochs=epochs if epochs else 50)
         elif model_type == "xgboost":
-            success = ml_engine.train_xgboost(symbol)
+            success = await run_in_threadpool(ml_engine.train_xgboost, symbol)
         else:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unsupported model type: {model_type}")
         
@@ -385,7 +396,9 @@ async def get_prediction(
         except Exception as e: # Catch Pydantic validation errors for cached data
             logger.warning(f"Error validating cached prediction data for {cache_key}: {e}. Fetching new prediction.")
 
-    prediction_result_dict = ml_engine.predict(symbol, model_type=model_type)
+    prediction_result_dict = await asyncio.get_running_loop().run_in_executor(
+        _ml_executor, functools.partial(ml_engine.predict, symbol, model_type=model_type)
+    )
     
     if "error" in prediction_result_dict:
         logger.error(f"Prediction error from ML Engine for {symbol} ({model_type}): {prediction_result_dict['error']}")
@@ -422,13 +435,14 @@ async def execute_ml_trade(
         f"using {model_type} model (confidence_threshold={confidence_threshold}, risk={risk_per_trade})."
     )
     
-    trading_service = get_user_trading_service(current_user)
+    trading_service = await run_in_threadpool(get_user_trading_service, current_user)
     if not ml_engine:
         logger.error("MLEngine not available for trade execution.")
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="ML Engine is not available.")
 
     try:
-        trade_execution_result_dict = trading_service.execute_trade(
+        trade_execution_result_dict = await run_in_threadpool(
+            trading_service.execute_trade,
             db=db,
             symbol=symbol,
             model_type=model_type,
@@ -473,10 +487,12 @@ async def run_backtest(
         logger.error("MLEngine not available for backtesting.")
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="ML Engine is not available.")
 
-    temp_trading_service = TradingService(api_key="dummy_for_backtest", secret_key="dummy_for_backtest", base_url=settings.ALPACA_BASE_URL)
+    temp_trading_service = await run_in_threadpool(TradingService, api_key="dummy_for_backtest", secret_key="dummy_for_backtest", base_url=settings.ALPACA_BASE_URL)
 
     try:
-        backtest_result_dict = temp_trading_service.backtest_strategy(
+        # Model inference is CPU-bound: run it in the threadpool so other requests keep being served
+        backtest_result_dict = await run_in_threadpool(
+            temp_trading_service.backtest_strategy,
             symbol=symbol,
             model_type=model_type,
             lookback=lookback,
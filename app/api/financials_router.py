@@ -5,6 +5,7 @@ from typing import List, Optional
 from datetime import date
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
 from app.db.session import get_db
@@ -95,13 +96,15 @@ async def fetch_fundamental_data_for_symbol(
     """
     logger.info(f"Request to fetch all fundamental data for symbol: {symbol.upper()}")
     
-    profile = service.fetch_and_upsert_company_profile(symbol)
+    # FinancialDataService is blocking (Polygon HTTP, Redis, sync SQLAlchemy); run it on the threadpool
+    # so these async endpoints don't stall the event loop for every other request.
+    profile = await run_in_threadpool(service.fetch_and_upsert_company_profile, symbol)
     if not profile:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Could not fetch or create profile for symbol {symbol}")
 
     # Fetch recent annual and quarterly reports as an example
-    service.fetch_and_upsert_financial_reports(symbol, timeframe_enum=TimeframeType.ANNUAL, limit=5)
-    service.fetch_and_upsert_financial_reports(symbol, timeframe_enum=TimeframeType.QUARTERLY, limit=8) 
+    await run_in_threadpool(service.fetch_and_upsert_financial_reports, symbol, timeframe_enum=TimeframeType.ANNUAL, limit=5)
+    await run_in_threadpool(service.fetch_and_upsert_financial_reports, symbol, timeframe_enum=TimeframeType.QUARTERLY, limit=8)
     
     # Optionally trigger initial ratio calculation here
     # service.get_or_calculate_and_store_key_ratios(symbol)
@@ -119,10 +122,10 @@ async def get_company_profile(
     If not found, attempts to fetch from Polygon.io and store it.
     """
     logger.info(f"Request for company profile: {symbol.upper()}")
-    profile = service.get_company_profile_from_db(symbol)
+    profile = await run_in_threadpool(service.get_company_profile_from_db, symbol)
     if not profile:
         logger.info(f"Profile for {symbol} not in DB, attempting to fetch from source...")
-        profile = service.fetch_and_upsert_company_profile(symbol)
+        profile = await run_in_threadpool(service.fetch_and_upsert_company_profile, symbol)
         if not profile:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Company profile not found for symbol {symbol}")
     return CompanyProfileResponse.model_validate(profile)
@@ -141,7 +144,7 @@ async def get_financial_reports(
     Allows filtering by report_type and timeframe.
     """
     logger.info(f"Request for financial reports: {symbol.upper()}, type: {report_type}, timeframe: {timeframe}, limit: {limit}")
-    reports = service.get_financial_reports_from_db(symbol, report_type, timeframe, limit)
+    reports = await run_in_threadpool(service.get_financial_reports_from_db, symbol, report_type, timeframe, limit)
     if not reports:
         # Optionally, you could try to trigger a fetch here if data is expected but missing
         # logger.info(f"No reports found for {symbol} with specified filters. Consider fetching.")
@@ -164,7 +167,7 @@ async def get_key_ratios(
     The calculation logic for ratios is comprehensive and may require various data points.
     """
     logger.info(f"Request for key ratios: {symbol.upper()}, effective_date: {effective_date}")
-    ratios = service.get_or_calculate_and_store_key_ratios(symbol, effective_date)
+    ratios = await run_in_threadpool(service.get_or_calculate_and_store_key_ratios, symbol, effective_date)
     if not ratios:
         # This could mean data wasn't available to calculate, or calculation failed.
         # The service logs details.
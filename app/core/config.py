@@ -68,13 +68,16 @@ class Settings(BaseSettings):
 
     # Redis
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://redis:6379/0") # (updated default to use 'redis' service name and specify DB 0)
+    ENABLE_L1_CACHE: bool = os.getenv("ENABLE_L1_CACHE", "true").lower() == "true" # In-process cache in front of Redis; disable in tests
     
     # ML Model Settings
     MODEL_PATH: str = os.getenv("MODEL_PATH", "app/ml/models") #
     
     # Polygon.io API
     POLYGON_API_KEY: Optional[str] = os.getenv("POLYGON_API_KEY") #
-    
+    POLYGON_MAX_CONCURRENCY: int = int(os.getenv("POLYGON_MAX_CONCURRENCY", "8")) # Worker threads for multi-symbol fetches
+    POLYGON_RATE_LIMIT_PER_SECOND: float = float(os.getenv("POLYGON_RATE_LIMIT_PER_SECOND", "5")) # Shared across all service instances
+
     # ML Configuration
     TRAINING_DATA_PATH: str = os.getenv("TRAINING_DATA_PATH", "data/training") #
     PREDICTION_CACHE_TTL: int = int(os.getenv("PREDICTION_CACHE_TTL", "3600"))  # 1 hour in seconds
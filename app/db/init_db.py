@@ -1,4 +1,5 @@
 import logging
+from sqlalchemy import Index, UniqueConstraint
 from sqlalchemy.orm import Session
 
 # Core application imports
@@ -10,7 +11,48 @@ from app.core.security import get_password_hash
 from app.db.session import engine, SessionLocal
 # This import assumes your Base and User model are accessible via app.models.models
 # e.g., defined in app/models/models.py or app/models/user.py and exposed via app/models/__init__.py
-from app.models.models import Base, User
+from app.models.models import Base, User, CompanyProfile, FinancialReport, KeyRatioSet
+
+
+# Unique constraints behind FinancialDataService's INSERT ... ON CONFLICT upserts. Declared on the model tables
+# so create_all builds them as well; names match the alembic revisions that add them to existing tables.
+_UPSERT_CONSTRAINTS = (
+    (CompanyProfile, "uq_company_profiles_symbol", ("symbol",)),
+    (FinancialReport, "uq_financial_reports_symbol_period_type_timeframe",
+     ("symbol", "period_of_report_date", "report_type", "timeframe")),
+    (KeyRatioSet, "uq_key_ratio_sets_symbol_date", ("symbol", "date")),
+)
+
+def _declare_upsert_constraints() -> None:
+    """Adds each upsert constraint to its model's table unless the model already declares an equivalent one."""
+    for model, name, columns in _UPSERT_CONSTRAINTS:
+        table = model.__table__
+        wanted = set(columns)
+        declared = any(
+            isinstance(constraint, UniqueConstraint) and set(constraint.columns.keys()) == wanted
+            for constraint in table.constraints
+        ) or any(index.unique and set(index.columns.keys()) == wanted for index in table.indexes)
+        if not declared:
+            table.append_constraint(UniqueConstraint(*columns, name=name))
+
+_declare_upsert_constraints()
+
+# Composite index for the latest-report reads (FinancialDataService._RANKED_STATEMENTS and friends): equality on
+# symbol, timeframe, report_type, then period_of_report_date DESC. Same name as alembic revision 003.
+_READ_INDEX_NAME = "ix_fr_sym_tf_rt_date"
+
+def _declare_read_indexes() -> None:
+    """Adds the financial_reports read index to the model's table unless the model already declares it."""
+    if not any(index.name == _READ_INDEX_NAME for index in FinancialReport.__table__.indexes):
+        Index(
+            _READ_INDEX_NAME,
+            FinancialReport.symbol,
+            FinancialReport.timeframe,
+            FinancialReport.report_type,
+            FinancialReport.period_of_report_date.desc(),
+        )
+
+_declare_read_indexes()
 
 
 logger = logging.getLogger(__name__)
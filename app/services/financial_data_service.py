@@ -1,16 +1,29 @@
 # File: app/services/financial_data_service.py
 
+import functools
 import logging
-from typing import Optional, List, Dict, Any
-from datetime import date, datetime, timezone, timedelta
+import math
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice
+from typing import Optional, List, Dict, Any, Callable, Iterator, Tuple
+from datetime import date, datetime, timezone
 
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy.orm import Session, aliased, raiseload
+from sqlalchemy import bindparam, case, desc, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from polygon import RESTClient
-from polygon.rest.models import TickerDetails, StockFinancial # Import specific Polygon models for type hints
+from polygon.exceptions import NoResultsError
+from polygon.rest.models import TickerDetails # Import specific Polygon models for type hints
 import redis
 from redis.exceptions import RedisError
-import json
+from cachetools import TTLCache
+import msgpack
+import numpy as np
+import zstandard as zstd
+from pydantic import TypeAdapter, ValidationError
 
 from app.core.config import settings
 # Models
@@ -47,82 +60,469 @@ def get_current_market_price(symbol: str, trading_service_instance: Optional[Any
     logger.warning(f"Live price fetching for {symbol} not implemented in FinancialDataService. Ratios needing price will be affected.")
     return None # Fallback
 
+
+# Cache wire format: msgpack. Datetimes use msgpack's native timestamp ext type; dates (not covered by it)
+# use a small custom ext type, so cached payloads round-trip to native objects with no re-parsing on read.
+# The Redis client passed to FinancialDataService must return bytes (decode_responses=False). With a str client,
+# cached entries fail to decode (UnicodeDecodeError / TypeError) and are treated as misses rather than errors.
+_MSGPACK_EXT_DATE = 1
+# Part of every cache key: bump when the payload format changes, so entries in the old format are never read
+# and simply expire. v2 = msgpack (v1 was JSON text).
+_CACHE_KEY_VERSION = "v2"
+
+def _msgpack_default(obj: Any) -> Any:
+    if isinstance(obj, date) and not isinstance(obj, datetime):
+        return msgpack.ExtType(_MSGPACK_EXT_DATE, obj.isoformat().encode())
+    raise TypeError(f"Object of type {obj.__class__.__name__} is not msgpack serializable")
+
+def _msgpack_ext_hook(code: int, data: bytes) -> Any:
+    if code == _MSGPACK_EXT_DATE:
+        return date.fromisoformat(data.decode())
+    return msgpack.ExtType(code, data)
+
+# Payloads above the threshold (financial reports, typically 40-150 KB) are zstd-compressed; small ones
+# (profiles) are stored as-is. Compressed values are recognised on read by the zstd frame magic number,
+# which can't start a msgpack map/array. zstd (de)compressor objects are not thread-safe, hence per-thread.
+_ZSTD_LEVEL = 3
+_ZSTD_MIN_BYTES = 1024
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+_zstd_local = threading.local()
+
+def _pack_cache_payload(data: Any) -> bytes:
+    packed = msgpack.packb(data, datetime=True, use_bin_type=True, default=_msgpack_default)
+    if len(packed) < _ZSTD_MIN_BYTES:
+        return packed
+    compressor = getattr(_zstd_local, "compressor", None)
+    if compressor is None:
+        compressor = _zstd_local.compressor = zstd.ZstdCompressor(level=_ZSTD_LEVEL)
+    return compressor.compress(packed)
+
+# Negative caching: when Polygon has no data for a key, a short-lived sentinel is stored instead so repeated
+# requests for unknown symbols don't each spend a rate-limited Polygon call. Reads surface it as _MISS, which
+# is falsy so a caller that doesn't check for it just falls back to a normal fetch.
+class _CacheMiss:
+    __slots__ = ()
+
+    def __bool__(self) -> bool:
+        return False
+
+    def __repr__(self) -> str:
+        return "MISS"
+
+_MISS = _CacheMiss()
+_MISS_SENTINEL = b"__MISS__" # Can't collide with a payload: those are msgpack maps/arrays or zstd frames
+
+def _unpack_cache_payload(raw: bytes) -> Any:
+    if raw == _MISS_SENTINEL:
+        return _MISS
+    if raw[:4] == _ZSTD_MAGIC:
+        decompressor = getattr(_zstd_local, "decompressor", None)
+        if decompressor is None:
+            decompressor = _zstd_local.decompressor = zstd.ZstdDecompressor()
+        raw = decompressor.decompress(raw)
+    return msgpack.unpackb(raw, timestamp=3, raw=False, ext_hook=_msgpack_ext_hook)
+
+def _to_date(value: Any) -> Optional[date]:
+    """Parses a Polygon 'YYYY-MM-DD' string once, at mapping time. Unparseable values become None."""
+    if not value or isinstance(value, date):
+        return value or None
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        logger.warning(f"Invalid date value from Polygon.io: {value!r}")
+        return None
+
+class _InFlight:
+    __slots__ = ("event", "result")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+
+# Single-flight registry: concurrent cache misses for the same key share one Polygon request.
+_INFLIGHT: Dict[str, _InFlight] = {}
+_INFLIGHT_LOCK = threading.Lock()
+_INFLIGHT_WAIT_SECONDS = 10
+
+def _single_flight(key: str, fn: Callable[[], Any]) -> Any:
+    """The first caller for `key` runs `fn`; callers arriving while it is in flight wait for and share its result."""
+    with _INFLIGHT_LOCK:
+        flight = _INFLIGHT.get(key)
+        is_leader = flight is None
+        if is_leader:
+            flight = _INFLIGHT[key] = _InFlight()
+    if not is_leader:
+        if flight.event.wait(timeout=_INFLIGHT_WAIT_SECONDS):
+            logger.debug(f"Shared in-flight result for key: {key}")
+            return flight.result
+        logger.warning(f"Timed out waiting for in-flight fetch of {key}. Fetching directly.")
+        return fn()
+    try:
+        flight.result = fn()
+        return flight.result
+    finally:
+        with _INFLIGHT_LOCK:
+            _INFLIGHT.pop(key, None)
+        flight.event.set()
+
+class _TokenBucket:
+    """Thread-safe token bucket. Polygon quotas are per API key, so a single
+    module-level bucket is shared by every FinancialDataService instance."""
+
+    def __init__(self, rate_per_second: float):
+        self.rate = rate_per_second
+        self.capacity = max(rate_per_second, 1.0)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_seconds = (1 - self._tokens) / self.rate
+            time.sleep(wait_seconds)
+
+# Validators built once at import instead of per call. Profiles and reports are validated when fetched from
+# Polygon, before they are cached, and cached with the coerced values: everything read back from the cache is
+# trusted and rebuilt with model_construct().
+_CP_ADAPTER = TypeAdapter(CompanyProfileCreate)
+_FR_ADAPTER = TypeAdapter(FinancialReportCreate)
+
+# HttpUrl fields validate to pydantic Url objects, which neither msgpack nor the DB driver accept
+_CP_URL_FIELDS = ("url", "logo_url")
+_FR_URL_FIELDS = ("source_filing_url", "source_filing_file_url")
+
+def _urls_to_str(values: Dict[str, Any], url_fields: tuple) -> Dict[str, Any]:
+    for field in url_fields:
+        if values.get(field) is not None:
+            values[field] = str(values[field])
+    return values
+
+# Statement sections of a Polygon StockFinancial.financials object that we keep
+_STMT_NAMES = ("income_statement", "balance_sheet", "cash_flow_statement", "comprehensive_income")
+
+# Conflict targets for the ON CONFLICT upserts; backed by unique constraints (alembic revisions 002 and 004).
+_FINANCIAL_REPORT_UPSERT_KEY = ("symbol", "period_of_report_date", "report_type", "timeframe")
+_REPORT_UPSERT_BATCH_ROWS = 60 # ~20 reports x 3 statement types per INSERT
+_FINANCIAL_REPORT_IMMUTABLE_COLUMNS = frozenset(_FINANCIAL_REPORT_UPSERT_KEY) | {"company_profile_id"} # Don't update key components
+_COMPANY_PROFILE_UPSERT_KEY = ("symbol",)
+_KEY_RATIO_UPSERT_KEY = ("symbol", "date")
+# Column names precomputed once: a set lookup per key instead of a hasattr() descriptor walk.
+_CP_COLS = frozenset(c.name for c in CompanyProfile.__table__.columns)
+
+_polygon_rate_limiter = _TokenBucket(settings.POLYGON_RATE_LIMIT_PER_SECOND)
+_POLYGON_MAX_RETRIES = 3
+_POLYGON_BACKOFF_BASE_SECONDS = 0.5
+_POLYGON_BACKOFF_CAP_SECONDS = 8.0
+
+def _error_status(error: Exception) -> Optional[int]:
+    return getattr(error, "status", None) or getattr(getattr(error, "response", None), "status_code", None)
+
+def _is_rate_limited(error: Exception) -> bool:
+    """Best-effort detection of an HTTP 429 from the Polygon client (it surfaces as BadResponse with the body as message)."""
+    message = str(error).lower()
+    return _error_status(error) == 429 or "429" in message or "too many requests" in message or "exceeded the maximum requests" in message
+
+def _is_no_data(error: Exception) -> bool:
+    """
+    True when the error means Polygon has no (usable) data for the request: no results, 404 / NOT_FOUND, or a
+    payload that fails validation. Only these are negative-cached; timeouts, connection errors, 5xx and rate
+    limits are transient and say nothing about the symbol.
+    """
+    if isinstance(error, (NoResultsError, ValidationError)):
+        return True
+    message = str(error).lower()
+    return _error_status(error) == 404 or "not_found" in message or "not found" in message
+
+def _call_polygon(fn: Callable[[], Any]) -> Any:
+    """Runs a Polygon request under the shared rate limiter, retrying 429s with exponential backoff + jitter."""
+    for attempt in range(_POLYGON_MAX_RETRIES + 1):
+        _polygon_rate_limiter.acquire()
+        try:
+            return fn()
+        except Exception as e:
+            if attempt >= _POLYGON_MAX_RETRIES or not _is_rate_limited(e):
+                raise
+            delay = min(_POLYGON_BACKOFF_CAP_SECONDS, _POLYGON_BACKOFF_BASE_SECONDS * 2 ** attempt) + random.random() * 0.1
+            logger.warning(f"Polygon.io rate limit hit (attempt {attempt + 1}/{_POLYGON_MAX_RETRIES}). Retrying in {delay:.2f}s.")
+            time.sleep(delay)
+
+@functools.lru_cache(maxsize=1)
+def _get_polygon_client() -> Optional[RESTClient]:
+    """One RESTClient per process: its urllib3 pool (kept-alive TLS connections) is reused across service instances."""
+    if not settings.POLYGON_API_KEY:
+        logger.error("POLYGON_API_KEY not configured. FinancialDataService may not function for fetching.")
+        return None
+    try:
+        # Explicit timeouts so a slow Polygon response can't pin a worker indefinitely
+        client = RESTClient(settings.POLYGON_API_KEY, connect_timeout=5, read_timeout=15)
+        logger.info("Polygon.io RESTClient initialized for FinancialDataService.")
+        return client
+    except Exception as e:
+        logger.error(f"Failed to initialize Polygon.io RESTClient: {e}", exc_info=True)
+        return None
+
+# Background pool for network-only prefetches (profile while financials are fetched, market price while
+# ratio inputs are read). Never runs DB work.
+_PREFETCH_EXECUTOR = ThreadPoolExecutor(max_workers=settings.POLYGON_MAX_CONCURRENCY, thread_name_prefix="polygon-prefetch")
+_PROFILE_PREFETCH_TIMEOUT_SECONDS = 10
+_PRICE_PREFETCH_TIMEOUT_SECONDS = 5
+
+# TickerDetails attribute -> CompanyProfile field, for fields copied as-is
+_TICKER_FIELDS = (
+    ("name", "name"),
+    ("cik", "cik"),
+    ("industry", "industry"), # May also need derivation from SIC
+    ("description", "description"),
+    ("primary_exchange", "exchange"),
+    ("currency_name", "currency"),
+    ("market_cap", "market_cap"),
+    ("phone_number", "phone"),
+    ("homepage_url", "url"),
+)
+
+# --- Key ratio arithmetic ---
+# Inputs become float64 columns with NaN for "missing", so each ratio is one masked division instead of a chain
+# of None/zero guards: a ratio is NaN (stored as None) when an input is missing or its denominator is zero.
+# Complete inputs (the common case for listed large caps) take the same single pass as incomplete ones.
+# Works on any number of symbols at once; a single symbol is a batch of one.
+_RATIO_INPUT_FIELDS = (
+    "price", "shares_outstanding", "eps", "revenue", "net_income", "gross_profit", "operating_income",
+    "total_liabilities", "total_equity", "current_assets", "current_liabilities", "inventory",
+)
+
+def _as_ratio_input(value: Any) -> float:
+    return float(value) if isinstance(value, (int, float)) else np.nan
+
+def _safe_divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    return np.divide(numerator, denominator, out=np.full_like(numerator, np.nan), where=denominator != 0)
+
+def _compute_ratios_batch(inputs: List[Dict[str, Any]]) -> List[Dict[str, Optional[float]]]:
+    """Computes the KeyRatioSet ratios for many symbols' inputs (see FinancialDataService._ratio_inputs) at once."""
+    col = {field: np.array([_as_ratio_input(row.get(field)) for row in inputs], dtype=np.float64) for field in _RATIO_INPUT_FIELDS}
+    # A zero price or share count means "unavailable", not a zero-valued ratio
+    price = np.where(col["price"] != 0, col["price"], np.nan)
+    shares = np.where(col["shares_outstanding"] != 0, col["shares_outstanding"], np.nan)
+    market_cap = price * shares
+    revenue, equity, current_liabilities = col["revenue"], col["total_equity"], col["current_liabilities"]
+
+    ratio_columns = {
+        "price_to_earnings_ratio": _safe_divide(price, col["eps"]),
+        "price_to_sales_ratio": _safe_divide(market_cap, revenue), # price / (revenue / shares)
+        "price_to_book_ratio": _safe_divide(market_cap, equity), # price / (equity / shares)
+        "earnings_per_share": col["eps"],
+        # Dividend Yield - Requires dividend data, not easily available from just financials/profile.
+        # For now, will leave as None. Polygon.io has a separate Dividends API.
+        "dividend_yield": np.full(len(inputs), np.nan),
+        "return_on_equity": _safe_divide(col["net_income"], equity),
+        "debt_to_equity_ratio": _safe_divide(col["total_liabilities"], equity),
+        "current_ratio": _safe_divide(col["current_assets"], current_liabilities),
+        "quick_ratio": _safe_divide(col["current_assets"] - col["inventory"], current_liabilities), # Acid test
+        "gross_profit_margin": _safe_divide(col["gross_profit"], revenue),
+        "operating_profit_margin": _safe_divide(col["operating_income"], revenue),
+        "net_profit_margin": _safe_divide(col["net_income"], revenue),
+    }
+    names = list(ratio_columns)
+    rows = zip(*(column.tolist() for column in ratio_columns.values()))
+    # isfinite rather than isnan: an overflowed product (inf) is no more a usable ratio than a missing one
+    return [{name: (value if math.isfinite(value) else None) for name, value in zip(names, row)} for row in rows]
+
+def _compute_ratios(inputs: Dict[str, Any]) -> Dict[str, Optional[float]]:
+    return _compute_ratios_batch([inputs])[0]
+
 class FinancialDataService:
+    # Cache TTLs (seconds) per kind of data, aligned to how often the source actually changes.
+    # For financials this is the "latest" index only: per-filing entries never expire.
+    CACHE_TTL = {
+        "company_profile": 7 * 86400, # Metadata is stable, but market cap / shares outstanding drift
+        "financials_annual": 30 * 86400, # A new 10-K shows up once a year
+        "financials_quarterly": 3 * 86400, # New 10-Qs should be picked up within days of filing
+        "miss": 300, # Negative results: short, so a newly listed symbol isn't hidden for long
+    }
+
+    # In-process L1 in front of Redis, shared by all instances. Entries are the decoded objects,
+    # so callers must treat cached values as read-only. 1024 entries x ~50 KB payloads stays around 50 MB.
+    _L1 = TTLCache(maxsize=1024, ttl=600)
+    _L1_LOCK = threading.RLock()
+
+    # Line items live in the FinancialReport.data JSON column, so nothing here needs a relationship: make any
+    # lazy load on loaded reports / ratio sets raise instead of silently issuing a query per row.
+    _NO_LAZY_LOADS = (raiseload("*"),)
+
+    # Hot read statements, built once with bind parameters instead of per call
+    _PROFILE_BY_SYMBOL = select(CompanyProfile).where(CompanyProfile.symbol == bindparam("symbol")).limit(1)
+    _PROFILE_ID_BY_SYMBOL = select(CompanyProfile.id).where(CompanyProfile.symbol == bindparam("symbol")).limit(1)
+    _PROFILE_IDS_BY_SYMBOLS = select(CompanyProfile.symbol, CompanyProfile.id).where(CompanyProfile.symbol.in_(bindparam("symbols", expanding=True)))
+    _LATEST_REPORT_DATE = (
+        select(FinancialReport.period_of_report_date)
+        .where(FinancialReport.symbol == bindparam("symbol"),
+               FinancialReport.timeframe.in_([TimeframeType.ANNUAL, TimeframeType.QUARTERLY]))
+        .order_by(case((FinancialReport.timeframe == TimeframeType.ANNUAL, 0), else_=1),
+                  desc(FinancialReport.period_of_report_date))
+        .limit(1)
+    )
+    _LATEST_STATEMENTS = (
+        select(FinancialReport)
+        .where(FinancialReport.symbol == bindparam("symbol"),
+               FinancialReport.report_type.in_(bindparam("stmt_types", expanding=True)),
+               FinancialReport.timeframe == bindparam("timeframe"),
+               FinancialReport.period_of_report_date <= bindparam("effective_date"))
+        .order_by(desc(FinancialReport.period_of_report_date))
+        .limit(bindparam("limit"))
+        .options(*_NO_LAZY_LOADS)
+    )
+    # Same filter, ranked per report type: rn == 1 is exactly the latest statement of each type, however
+    # unevenly the types were filed. Each partition is a backward range read on ix_fr_sym_tf_rt_date.
+    _RANKED_STATEMENTS = (
+        select(FinancialReport,
+               func.row_number().over(
+                   partition_by=FinancialReport.report_type,
+                   order_by=desc(FinancialReport.period_of_report_date)).label("rn"))
+        .where(FinancialReport.symbol == bindparam("symbol"),
+               FinancialReport.report_type.in_(bindparam("stmt_types", expanding=True)),
+               FinancialReport.timeframe == bindparam("timeframe"),
+               FinancialReport.period_of_report_date <= bindparam("effective_date"))
+        .subquery("ranked_statements")
+    )
+    _LATEST_STATEMENT_PER_TYPE = (
+        select(aliased(FinancialReport, _RANKED_STATEMENTS))
+        .where(_RANKED_STATEMENTS.c.rn == 1)
+        .options(*_NO_LAZY_LOADS)
+    )
+
     def __init__(self, db_session: Session, redis_client: Optional[redis.Redis] = None, trading_service: Optional[Any] = None): # Added trading_service
         self.db = db_session
         self.redis = redis_client
         self.trading_service = trading_service # For fetching live prices for ratios
-        if not settings.POLYGON_API_KEY:
-            logger.error("POLYGON_API_KEY not configured. FinancialDataService may not function for fetching.")
-            self.polygon_client = None
-        else:
-            try:
-                self.polygon_client = RESTClient(settings.POLYGON_API_KEY)
-                logger.info("Polygon.io RESTClient initialized for FinancialDataService.")
-            except Exception as e:
-                logger.error(f"Failed to initialize Polygon.io RESTClient: {e}", exc_info=True)
-                self.polygon_client = None
+        self.polygon_client = _get_polygon_client() # Shared across instances (per-request DI creates many)
+        # Short-lived memo for repeated ratio lookups within one request (screener loops). Per instance, since the
+        # memoized KeyRatioSet objects belong to this instance's session.
+        self._ratios_memo: TTLCache = TTLCache(maxsize=1024, ttl=60)
 
     def _get_from_cache(self, cache_key: str) -> Optional[Any]:
+        if settings.ENABLE_L1_CACHE:
+            with self._L1_LOCK:
+                l1_value = self._L1.get(cache_key)
+            if l1_value is not None:
+                logger.debug(f"L1 cache hit for key: {cache_key}")
+                return l1_value
         if not self.redis:
             return None
         try:
             cached_data = self.redis.get(cache_key)
             if cached_data:
                 logger.debug(f"Cache hit for key: {cache_key}")
-                return json.loads(cached_data)
+                value = _unpack_cache_payload(cached_data)
+                if settings.ENABLE_L1_CACHE and value is not _MISS: # Misses expire sooner than L1 entries; keep them in Redis only
+                    with self._L1_LOCK:
+                        self._L1[cache_key] = value
+                return value
         except RedisError as e:
             logger.warning(f"Redis error getting cache for {cache_key}: {e}")
-        except json.JSONDecodeError as e:
-            logger.warning(f"Error decoding cached JSON for {cache_key}: {e}")
+        # Corrupt or foreign payloads, or a decode_responses=True client (str values; ValueError covers UnicodeDecodeError)
+        except (msgpack.UnpackException, zstd.ZstdError, ValueError, TypeError) as e:
+            logger.warning(f"Error decoding cached payload for {cache_key}: {e}")
         return None
 
-    def _set_to_cache(self, cache_key: str, data: Any, ttl_seconds: int = 3600 * 24): # Default 1 day
-        if not self.redis:
+    def _get_many_from_cache(self, cache_keys: List[str]) -> Dict[str, Any]:
+        """Batched _get_from_cache: L1 first, then a single MGET for the rest. Missing keys are omitted."""
+        found: Dict[str, Any] = {}
+        pending = list(cache_keys)
+        if settings.ENABLE_L1_CACHE:
+            with self._L1_LOCK:
+                for key in cache_keys:
+                    l1_value = self._L1.get(key)
+                    if l1_value is not None:
+                        found[key] = l1_value
+            pending = [key for key in cache_keys if key not in found]
+        if not pending or not self.redis:
+            return found
+        try:
+            for key, cached_data in zip(pending, self.redis.mget(pending)):
+                if not cached_data:
+                    continue
+                try:
+                    found[key] = _unpack_cache_payload(cached_data)
+                except (msgpack.UnpackException, zstd.ZstdError, ValueError, TypeError) as e:
+                    logger.warning(f"Error decoding cached payload for {key}: {e}")
+        except RedisError as e:
+            logger.warning(f"Redis error getting cache for {len(pending)} keys: {e}")
+        except UnicodeDecodeError as e: # decode_responses=True client failing on a binary payload: all pending are misses
+            logger.warning(f"Error decoding cached payloads for {len(pending)} keys: {e}")
+        if settings.ENABLE_L1_CACHE:
+            with self._L1_LOCK:
+                for key in pending:
+                    if key in found and found[key] is not _MISS:
+                        self._L1[key] = found[key]
+        return found
+
+    def _set_to_cache(self, cache_key: str, data: Any, ttl_seconds: Optional[int] = 3600 * 24): # Default 1 day; None = no expiry
+        self._set_many_to_cache({cache_key: data}, ttl_seconds=ttl_seconds)
+
+    def _set_many_to_cache(self, items: Dict[str, Any], ttl_seconds: Optional[int] = 3600 * 24):
+        """Writes all items in one pipelined round-trip. ttl_seconds=None stores without expiry."""
+        if settings.ENABLE_L1_CACHE:
+            with self._L1_LOCK:
+                self._L1.update(items)
+        if not self.redis or not items:
             return
+        cache_key = ", ".join(items) # For log messages
         try:
-            # Custom default function to handle date/datetime for JSON serialization
-            def json_converter(o):
-                if isinstance(o, (datetime, date)):
-                    return o.isoformat()
-                raise TypeError(f"Object of type {o.__class__.__name__} is not JSON serializable")
-            
-            self.redis.setex(cache_key, ttl_seconds, json.dumps(data, default=json_converter))
-            logger.debug(f"Data cached for key: {cache_key} with TTL: {ttl_seconds}s")
+            pipe = self.redis.pipeline(transaction=False)
+            for key, data in items.items():
+                if ttl_seconds is None:
+                    pipe.set(key, _pack_cache_payload(data))
+                else:
+                    pipe.setex(key, ttl_seconds, _pack_cache_payload(data))
+            pipe.execute()
+            logger.debug(f"Data cached for key: {cache_key} with TTL: {ttl_seconds if ttl_seconds is not None else 'none'}")
         except RedisError as e:
             logger.warning(f"Redis error setting cache for {cache_key}: {e}")
-        except (TypeError, OverflowError) as serialization_error:
+        except (TypeError, ValueError, OverflowError) as serialization_error: # ValueError: naive datetimes
             logger.error(f"Failed to serialize data for caching {cache_key}: {serialization_error}")
 
-    def _map_polygon_ticker_details_to_profile_dict(self, symbol: str, details: TickerDetails) -> Dict[str, Any]:
+    def _set_miss_to_cache(self, cache_key: str):
+        """Records that Polygon has no data for cache_key, for CACHE_TTL["miss"]."""
+        if settings.ENABLE_L1_CACHE:
+            with self._L1_LOCK:
+                self._L1.pop(cache_key, None)
+        if not self.redis:
+            return
+        try:
+            self.redis.setex(cache_key, self.CACHE_TTL["miss"], _MISS_SENTINEL)
+        except RedisError as e:
+            logger.warning(f"Redis error setting negative cache for {cache_key}: {e}")
+
+    def _map_polygon_ticker_details_to_profile_dict(self, symbol: str, details: TickerDetails, now_utc: datetime) -> Dict[str, Any]:
         """Maps Polygon.io TickerDetails object to our CompanyProfile dictionary structure."""
-        profile_dict = {
-            "symbol": getattr(details, 'ticker', symbol.upper()),
-            "name": getattr(details, 'name', None),
-            "cik": getattr(details, 'cik', None),
-            "sector": getattr(details, 'sector', None) or getattr(details, 'sic_description', None),
-            "industry": getattr(details, 'industry', None), # May also need derivation from SIC
-            "description": getattr(details, 'description', None),
-            "country": None, # Default
-            "exchange": getattr(details, 'primary_exchange', None),
-            "currency": getattr(details, 'currency_name', None),
-            "market_cap": getattr(details, 'market_cap', None),
-            "shares_outstanding": getattr(details, 'weighted_shares_outstanding', None) or \
-                                  getattr(details, 'share_class_shares_outstanding', None),
-            "phone": getattr(details, 'phone_number', None),
-            "url": getattr(details, 'homepage_url', None),
-            "logo_url": None, # Default
-            "list_date": date.fromisoformat(details.list_date) if getattr(details, 'list_date', None) else None,
-            "last_refreshed": datetime.now(timezone.utc) # Our refresh time
-        }
-        if hasattr(details, 'address') and details.address:
-            profile_dict["country"] = getattr(details.address, 'country_code', None) or getattr(details.address, 'country', None)
-        if hasattr(details, 'branding') and details.branding:
-            profile_dict["logo_url"] = getattr(details.branding, 'logo_url', None) or getattr(details.branding, 'icon_url', None)
+        # Polygon model classes are plain dataclasses: read the instance dict once. Straight copies come from
+        # the _TICKER_FIELDS table; fields with fallbacks or parsing are filled in afterwards.
+        fields = vars(details)
+        profile_dict = {dst: fields.get(src) for src, dst in _TICKER_FIELDS}
+        profile_dict["symbol"] = fields.get('ticker') or symbol.upper()
+        profile_dict["sector"] = fields.get('sector') or fields.get('sic_description')
+        profile_dict["shares_outstanding"] = fields.get('weighted_shares_outstanding') or fields.get('share_class_shares_outstanding')
+        profile_dict["country"] = None # Default
+        profile_dict["logo_url"] = None # Default
+        profile_dict["list_date"] = _to_date(fields.get('list_date'))
+        profile_dict["last_refreshed"] = now_utc # Our refresh time
+        address = fields.get('address')
+        if address:
+            profile_dict["country"] = getattr(address, 'country_code', None) or getattr(address, 'country', None)
+        branding = fields.get('branding')
+        if branding:
+            profile_dict["logo_url"] = getattr(branding, 'logo_url', None) or getattr(branding, 'icon_url', None)
         
         # Polygon sometimes returns CIK as a string of digits, sometimes as integer. Standardize.
-        if profile_dict["cik"] is not None and not isinstance(profile_dict["cik"], str):
-            profile_dict["cik"] = str(profile_dict["cik"]).zfill(10) # CIK is 10 digits
+        cik = profile_dict["cik"]
+        if cik is not None:
+            profile_dict["cik"] = cik.zfill(10) if type(cik) is str else f"{int(cik):010d}" # CIK is 10 digits
 
         return profile_dict
 
@@ -130,146 +530,438 @@ class FinancialDataService:
         if not self.polygon_client:
             logger.error("Polygon client not initialized. Cannot fetch profile.")
             return None
+        profile_data_dict = self._fetch_company_profile_data(symbol)
+        if not profile_data_dict:
+            return None
+        return self._upsert_company_profile(symbol, profile_data_dict)
 
-        cache_key = f"polygon:company_profile:{symbol.upper()}"
+    def _ensure_profile_async(self, symbol: str) -> "Future[Optional[Dict[str, Any]]]":
+        """Starts the profile fetch (cache/Polygon only) in the background; the DB upsert stays with the caller."""
+        return _PREFETCH_EXECUTOR.submit(self._fetch_company_profile_data, symbol)
+
+    @staticmethod
+    def _profile_cache_key(symbol: str) -> str:
+        return f"polygon:{_CACHE_KEY_VERSION}:company_profile:{symbol.upper()}"
+
+    def _fetch_company_profile_data(self, symbol: str) -> Optional[Dict[str, Any]]:
+        """Returns the mapped profile dict from cache or Polygon.io. Does not touch the DB."""
+        cache_key = self._profile_cache_key(symbol)
         # Attempt to load from cache
         cached_dict = self._get_from_cache(cache_key)
         profile_data_dict: Optional[Dict[str, Any]] = None
 
+        if cached_dict is _MISS:
+            logger.info(f"Polygon.io recently had no company profile for {symbol}; skipping fetch.")
+            return None
         if cached_dict:
             logger.info(f"Using cached company profile for {symbol}.")
-            profile_data_dict = cached_dict
-            # Deserialize dates if loaded from JSON string
-            if profile_data_dict.get("list_date") and isinstance(profile_data_dict["list_date"], str):
-                try:
-                    profile_data_dict["list_date"] = date.fromisoformat(profile_data_dict["list_date"])
-                except ValueError:
-                    logger.warning(f"Invalid date format for list_date in cached data for {symbol}: {profile_data_dict['list_date']}")
-                    profile_data_dict["list_date"] = None
-            if profile_data_dict.get("last_refreshed") and isinstance(profile_data_dict["last_refreshed"], str):
-                try:
-                    profile_data_dict["last_refreshed"] = datetime.fromisoformat(profile_data_dict["last_refreshed"].replace("Z","+00:00"))
-                except ValueError:
-                     profile_data_dict["last_refreshed"] = datetime.now(timezone.utc) # Fallback
+            profile_data_dict = cached_dict # list_date / last_refreshed come back as date / datetime
 
         if not profile_data_dict: # Not in cache or cache invalid
+            profile_data_dict = self._fetch_profile_from_polygon(symbol)
+        return profile_data_dict
+
+    def _fetch_profile_from_polygon(self, symbol: str) -> Optional[Dict[str, Any]]:
+        """Cache-miss path: fetches, maps and caches one profile (single-flight per symbol)."""
+        cache_key = self._profile_cache_key(symbol)
+
+        def fetch_profile_from_polygon() -> Optional[Dict[str, Any]]:
             try:
                 logger.info(f"Fetching company profile for {symbol} from Polygon.io...")
-                details: TickerDetails = self.polygon_client.get_ticker_details(symbol.upper())
-                profile_data_dict = self._map_polygon_ticker_details_to_profile_dict(symbol, details)
-                self._set_to_cache(cache_key, profile_data_dict)
-            except Exception as e: # Catch specific Polygon exceptions if known, e.g., NoResultsError
+                details: TickerDetails = _call_polygon(lambda: self.polygon_client.get_ticker_details(symbol.upper()))
+                mapped_profile = self._map_polygon_ticker_details_to_profile_dict(symbol, details, datetime.now(timezone.utc))
+                # Never cache what the upsert would reject, and cache the coerced values so cache hits need no re-validation.
+                # exclude_unset keeps unmapped fields (e.g. ceo) out, so the upsert leaves their stored values alone.
+                validated = _CP_ADAPTER.validate_python({k: v for k, v in mapped_profile.items() if k != "last_refreshed"})
+                fetched_profile = _urls_to_str(validated.model_dump(mode="python", exclude_unset=True), _CP_URL_FIELDS)
+                fetched_profile["last_refreshed"] = mapped_profile["last_refreshed"]
+                self._set_to_cache(cache_key, fetched_profile, ttl_seconds=self.CACHE_TTL["company_profile"])
+                return fetched_profile
+            except Exception as e: # Catch specific Polygon exceptions if known, e.g., NoResultsError; also Pydantic validation errors
                 logger.error(f"Error fetching company profile for {symbol} from Polygon.io: {e}", exc_info=True)
+                if _is_no_data(e): # An outage or throttling says nothing about the symbol: retry on the next request
+                    self._set_miss_to_cache(cache_key)
                 return None
-        
-        if not profile_data_dict: # Should not happen if API call was successful
-            return None
 
-        # Upsert to DB
+        return _single_flight(cache_key, fetch_profile_from_polygon)
+
+    def fetch_profiles_bulk(self, symbols: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Mapped profile dicts for many symbols: one batched cache read for all of them, then concurrent
+        Polygon fetches for the misses only. Symbols with no profile map to None. Does not touch the DB.
+        """
+        unique_symbols = list(dict.fromkeys(s.upper() for s in symbols))
+        cached = self._get_many_from_cache([self._profile_cache_key(s) for s in unique_symbols])
+        results: Dict[str, Optional[Dict[str, Any]]] = {}
+        missing: List[str] = []
+        for symbol in unique_symbols:
+            cached_dict = cached.get(self._profile_cache_key(symbol))
+            if cached_dict is _MISS:
+                results[symbol] = None
+            elif cached_dict:
+                results[symbol] = cached_dict
+            else:
+                missing.append(symbol)
+        if missing:
+            if not self.polygon_client:
+                logger.error("Polygon client not initialized. Cannot fetch profiles.")
+                results.update(dict.fromkeys(missing))
+            else:
+                logger.info(f"Fetching {len(missing)} of {len(unique_symbols)} company profiles from Polygon.io.")
+                results.update(self.fetch_many(missing, self._fetch_profile_from_polygon))
+        return results
+
+    @staticmethod
+    def _profile_upsert_values(profile_data_dict: Dict[str, Any]) -> Dict[str, Any]:
+        """Column values for the profile upsert, from a mapped (cached or fetched) profile dict."""
         # Remove last_refreshed from dict before passing to Pydantic schema if it's meant for schema's default_factory
-        db_last_refreshed_time = profile_data_dict.pop("last_refreshed", datetime.now(timezone.utc))
+        db_last_refreshed_time = profile_data_dict.get("last_refreshed") or datetime.now(timezone.utc)
+        profile_fields = {k: v for k, v in profile_data_dict.items() if k != "last_refreshed"} # Don't mutate the cached dict
 
-        try:
-            profile_schema_data = CompanyProfileCreate(**profile_data_dict) # Validate with Pydantic
-        except Exception as e: # Pydantic validation error
-            logger.error(f"Pydantic validation error for company profile {symbol}: {e}", exc_info=True)
-            return None
+        # Validated and coerced before it was cached (see _fetch_profile_from_polygon): skip re-validation
+        profile_schema_data = CompanyProfileCreate.model_construct(**profile_fields)
+
+        # Only fields explicitly set are written, so columns we don't map (e.g. ceo) keep their stored value on update.
+        # Values come straight from the validated __dict__ (no model_dump() rebuild); schema-only fields are dropped.
+        profile_values = {k: v for k, v in profile_schema_data.__dict__.items() if k in profile_schema_data.model_fields_set and k in _CP_COLS}
+        profile_values["last_refreshed"] = db_last_refreshed_time # Use the refresh time from fetch/cache
+        return profile_values
+
+    def _upsert_company_profile(self, symbol: str, profile_data_dict: Dict[str, Any]) -> Optional[CompanyProfile]:
+        # Single INSERT ... ON CONFLICT (symbol) DO UPDATE instead of SELECT-then-INSERT/UPDATE.
+        profile_values = self._profile_upsert_values(profile_data_dict)
+        upsert_stmt = pg_insert(CompanyProfile).values(**profile_values)
+        upsert_stmt = upsert_stmt.on_conflict_do_update(
+            index_elements=list(_COMPANY_PROFILE_UPSERT_KEY),
+            set_={key: upsert_stmt.excluded[key] for key in profile_values if key not in _COMPANY_PROFILE_UPSERT_KEY},
+        ).returning(CompanyProfile)
 
-        db_profile = self.db.query(CompanyProfile).filter(CompanyProfile.symbol == profile_schema_data.symbol).first()
-        if db_profile:
-            logger.info(f"Updating existing company profile for {symbol} in DB.")
-            for key, value in profile_schema_data.model_dump(exclude_unset=True).items():
-                setattr(db_profile, key, value)
-            db_profile.last_refreshed = db_last_refreshed_time # Use the refresh time from fetch/cache
-        else:
-            logger.info(f"Creating new company profile for {symbol} in DB.")
-            db_profile = CompanyProfile(**profile_schema_data.model_dump())
-            db_profile.last_refreshed = db_last_refreshed_time
-        
         try:
-            self.db.add(db_profile)
+            logger.info(f"Upserting company profile for {symbol} in DB.")
+            db_profile = self.db.scalars(upsert_stmt, execution_options={"populate_existing": True}).one()
             self.db.commit()
-            self.db.refresh(db_profile)
             return db_profile
         except Exception as e:
             self.db.rollback()
             logger.error(f"DB error storing company profile for {symbol}: {e}", exc_info=True)
             return None
 
+    def _upsert_company_profiles(self, profiles: Dict[str, Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Batched _upsert_company_profile: one multi-row INSERT ... ON CONFLICT per distinct column set (normally
+        just one) and a single commit. Returns symbol -> CompanyProfile id; empty if the write fails.
+        """
+        rows_by_columns: Dict[frozenset, List[Dict[str, Any]]] = {}
+        for profile_data_dict in profiles.values():
+            profile_values = self._profile_upsert_values(profile_data_dict)
+            rows_by_columns.setdefault(frozenset(profile_values), []).append(profile_values)
+        try:
+            logger.info(f"Upserting {len(profiles)} company profiles in DB.")
+            profile_ids: Dict[str, int] = {}
+            for columns, rows in rows_by_columns.items():
+                upsert_stmt = pg_insert(CompanyProfile).values(rows)
+                upsert_stmt = upsert_stmt.on_conflict_do_update(
+                    index_elements=list(_COMPANY_PROFILE_UPSERT_KEY),
+                    set_={key: upsert_stmt.excluded[key] for key in columns if key not in _COMPANY_PROFILE_UPSERT_KEY},
+                ).returning(CompanyProfile.symbol, CompanyProfile.id)
+                profile_ids.update(self.db.execute(upsert_stmt).tuples())
+            self.db.commit()
+            return profile_ids
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"DB error storing company profiles for {list(profiles)}: {e}", exc_info=True)
+            return {}
+
     def get_company_profile_from_db(self, symbol: str) -> Optional[CompanyProfile]:
         logger.debug(f"Fetching company profile for {symbol.upper()} from DB.")
-        return self.db.query(CompanyProfile).filter(CompanyProfile.symbol == symbol.upper()).first()
+        return self.db.execute(self._PROFILE_BY_SYMBOL, {"symbol": symbol.upper()}).scalar_one_or_none()
 
     def _extract_financial_values(self, statement_section: Optional[Dict[str, Any]]) -> Dict[str, Any]:
         """Extracts 'value' from each line item in a Polygon.io financial statement section (e.g., income_statement)."""
         if not statement_section:
             return {}
-        return {key: getattr(item, 'value', None) for key, item in statement_section.items()}
+        return {key: item.value if item is not None else None for key, item in statement_section.items()}
 
-    def fetch_and_upsert_financial_reports(self, symbol: str, timeframe_enum: TimeframeType = TimeframeType.ANNUAL, limit: int = 5) -> List[FinancialReport]:
-        if not self.polygon_client:
-            logger.error(f"Polygon client not initialized. Cannot fetch financials for {symbol}.")
-            return []
+    def fetch_many(self, symbols: List[str], fn: Callable[[str], Any]) -> Dict[str, Any]:
+        """
+        Runs `fn(symbol)` for each symbol on a thread pool. Intended for the I/O-bound Polygon/Redis part of
+        a fetch only - the SQLAlchemy session is not thread-safe, so `fn` must not touch `self.db`.
+        Failed symbols map to None.
+        """
+        unique_symbols = list(dict.fromkeys(s.upper() for s in symbols))
+        results: Dict[str, Any] = {}
+        if not unique_symbols:
+            return results
+        max_workers = max(1, min(settings.POLYGON_MAX_CONCURRENCY, len(unique_symbols)))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {symbol: executor.submit(fn, symbol) for symbol in unique_symbols}
+            for symbol, future in futures.items():
+                try:
+                    results[symbol] = future.result()
+                except Exception as e:
+                    logger.error(f"Concurrent fetch failed for {symbol}: {e}", exc_info=True)
+                    results[symbol] = None
+        return results
 
-        profile = self.get_company_profile_from_db(symbol)
-        if not profile:
-            profile = self.fetch_and_upsert_company_profile(symbol) # Attempt to fetch profile if missing
-            if not profile:
-                logger.error(f"Company profile for {symbol} not found and could not be fetched. Cannot store financials.")
-                return []
-        
-        company_profile_id = profile.id
-        timeframe_value = timeframe_enum.value.lower() # Polygon expects 'annual' or 'quarterly'
-        cache_key = f"polygon:financials:{symbol.upper()}:{timeframe_value}:{limit}"
+    def _get_company_profile_id(self, symbol: str) -> Optional[int]:
+        # Only the PK is needed for the FK, so select just the id instead of materializing the whole profile row
+        return self.db.execute(self._PROFILE_ID_BY_SYMBOL, {"symbol": symbol.upper()}).scalar_one_or_none()
+
+    def _fetch_financial_reports_payload(self, symbol: str, timeframe_value: str, limit: int) -> Tuple[Optional[List[Dict[str, Any]]], bool]:
+        """
+        Returns Polygon financial reports mapped to plain dicts (cache first), None on fetch error, and whether
+        they came from the cache. Does not touch the DB.
+        """
+        cache_key = self._latest_financials_key(symbol, timeframe_value, limit)
         
-        # This list will store dicts mapped from Polygon's StockFinancial objects
-        raw_reports_as_dicts: List[Dict[str, Any]] = self._get_from_cache(cache_key) or []
+        cached_reports = self._get_cached_financial_reports(cache_key)
+        if cached_reports is _MISS:
+            logger.info(f"Polygon.io recently had no {timeframe_value} financial reports for {symbol}; skipping fetch.")
+            return [], False
+        if cached_reports:
+            logger.info(f"Using cached financial reports for {symbol} ({timeframe_value}).")
+            return cached_reports, True
 
-        if not raw_reports_as_dicts:
+        def fetch_reports_from_polygon() -> Optional[List[Dict[str, Any]]]:
+            # This list will store dicts mapped from Polygon's StockFinancial objects
+            raw_reports_as_dicts: List[Dict[str, Any]] = []
             try:
                 logger.info(f"Fetching {timeframe_value} financial reports for {symbol} (limit {limit}) from Polygon.io...")
-                financials_iter = self.polygon_client.list_stock_financials(
+                # The iterator is lazy (HTTP happens on iteration), so materialize it inside the rate-limited call.
+                # `limit` is only the page size - the SDK follows next_url through every page - so stop after `limit`
+                # reports with islice: exactly one page is requested instead of the symbol's whole filing history.
+                fetched_polygon_reports = _call_polygon(lambda: list(islice(self.polygon_client.list_stock_financials(
                     ticker=symbol.upper(),
                     timeframe=timeframe_value,
                     limit=limit,
                     sort="filing_date" # Get most recent first
-                )
-                
-                fetched_polygon_reports = list(financials_iter) # Convert iterator
+                ), limit)))
                 
                 for report_obj in fetched_polygon_reports: # report_obj is a StockFinancial
                     # Map Polygon's StockFinancial object to a dictionary for caching and processing
-                    financials_data_points = {}
-                    if hasattr(report_obj, 'financials'):
-                        financials_data_points["income_statement"] = self._extract_financial_values(getattr(report_obj.financials, 'income_statement', None))
-                        financials_data_points["balance_sheet"] = self._extract_financial_values(getattr(report_obj.financials, 'balance_sheet', None))
-                        financials_data_points["cash_flow_statement"] = self._extract_financial_values(getattr(report_obj.financials, 'cash_flow_statement', None))
-                        financials_data_points["comprehensive_income"] = self._extract_financial_values(getattr(report_obj.financials, 'comprehensive_income', None))
+                    report_fields = vars(report_obj)
+                    financials_obj = report_fields.get('financials')
+                    # Absent/empty sections are skipped downstream anyway, so they are not kept (smaller cache payloads)
+                    financials_data_points = {
+                        name: self._extract_financial_values(section)
+                        for name in _STMT_NAMES
+                        if (section := getattr(financials_obj, name, None))
+                    } if financials_obj is not None else {}
 
                     report_dict = {
-                        "filing_date": report_obj.filing_date,
-                        "start_date": report_obj.start_date,
-                        "end_date": report_obj.end_date, # This is period_of_report_date
-                        "fiscal_year": getattr(report_obj, 'fiscal_year', None),
-                        "fiscal_period": getattr(report_obj, 'fiscal_period', None),
-                        "timeframe": getattr(report_obj, 'timeframe', timeframe_value), # 'annual' or 'quarterly'
-                        "source_filing_url": getattr(report_obj, 'source_filing_url', None),
-                        "source_filing_file_url": getattr(report_obj, 'source_filing_file_url', None),
-                        "acceptance_datetime": getattr(report_obj, 'acceptance_datetime', None),
+                        "filing_date": _to_date(report_fields.get('filing_date')),
+                        "start_date": _to_date(report_fields.get('start_date')),
+                        "end_date": _to_date(report_fields.get('end_date')), # This is period_of_report_date
+                        "fiscal_year": report_fields.get('fiscal_year'),
+                        "fiscal_period": report_fields.get('fiscal_period'),
+                        "timeframe": report_fields.get('timeframe') or timeframe_value, # 'annual' or 'quarterly'
+                        "source_filing_url": report_fields.get('source_filing_url'),
+                        "source_filing_file_url": report_fields.get('source_filing_file_url'),
+                        "acceptance_datetime": report_fields.get('acceptance_datetime'),
                         "financials": financials_data_points # This contains the extracted values
                     }
+                    # Validated here rather than only when rows are built, so cached reports are always complete and trusted
+                    try:
+                        report_dict = self._validated_report_dict(symbol, report_dict)
+                    except ValueError as val_err: # Pydantic ValidationError (e.g. missing dates) or an unknown timeframe
+                        logger.warning(f"Skipping {symbol} report for period ending {report_fields.get('end_date')!r}: {val_err}")
+                        continue
                     raw_reports_as_dicts.append(report_dict)
                 
                 if raw_reports_as_dicts:
-                    self._set_to_cache(cache_key, raw_reports_as_dicts)
+                    self._cache_financial_reports(symbol, timeframe_value, cache_key, raw_reports_as_dicts)
+                else:
+                    self._set_miss_to_cache(cache_key)
                 
             except Exception as e:
                 logger.error(f"Error fetching financial reports for {symbol} from Polygon.io: {e}", exc_info=True)
-                return []
+                if _is_no_data(e):
+                    self._set_miss_to_cache(cache_key)
+                return None
+            return raw_reports_as_dicts
+
+        return _single_flight(cache_key, fetch_reports_from_polygon), False
+
+    # Financial report cache layout:
+    #   latest:polygon:{version}:financials:{SYMBOL}:{timeframe}:{limit} -> {"generated_at", "keys": per-filing keys} (expires, invalidatable)
+    #   immutable:polygon:{version}:financials:{SYMBOL}:{timeframe}:{fiscal_year}:{fiscal_period} -> one report (no expiry)
+    # Filed reports don't change, so they are cached once and shared by every `limit`; only the index goes stale.
+    @staticmethod
+    def _latest_financials_key(symbol: str, timeframe_value: str, limit: int) -> str:
+        return f"latest:polygon:{_CACHE_KEY_VERSION}:financials:{symbol.upper()}:{timeframe_value}:{limit}"
+
+    @staticmethod
+    def _immutable_financials_key(symbol: str, timeframe_value: str, report: Dict[str, Any]) -> str:
+        if report.get("fiscal_year") and report.get("fiscal_period"):
+            period_id = f"{report['fiscal_year']}:{report['fiscal_period']}"
         else:
-            logger.info(f"Using cached financial reports for {symbol} ({timeframe_value}).")
+            period_id = f"end:{report.get('end_date')}"
+        return f"immutable:polygon:{_CACHE_KEY_VERSION}:financials:{symbol.upper()}:{timeframe_value}:{period_id}"
 
-        stored_db_reports: List[FinancialReport] = []
+    def _get_cached_financial_reports(self, latest_key: str) -> Optional[List[Dict[str, Any]]]:
+        """Cached reports for the index key, None on a cache miss, or _MISS if Polygon recently had none."""
+        index = self._get_from_cache(latest_key)
+        if index is _MISS:
+            return _MISS
+        if not isinstance(index, dict): # Absent, or a pre-generated_at list index: refetch
+            return None
+        report_keys = index["keys"]
+        logger.debug(f"Report index {latest_key} generated {datetime.now(timezone.utc) - index['generated_at']} ago.")
+        reports_by_key = self._get_many_from_cache(report_keys)
+        if len(reports_by_key) != len(report_keys): # A filing entry was evicted; treat as a miss and refetch
+            return None
+        return [reports_by_key[key] for key in report_keys]
+
+    def _cache_financial_reports(self, symbol: str, timeframe_value: str, latest_key: str, reports: List[Dict[str, Any]]) -> None:
+        reports_by_key: Dict[str, Dict[str, Any]] = {}
+        for report in reports: # Sorted most recent filing first, so an amendment wins over the original
+            reports_by_key.setdefault(self._immutable_financials_key(symbol, timeframe_value, report), report)
+        self._set_many_to_cache(reports_by_key, ttl_seconds=None)
+        index = {"generated_at": datetime.now(timezone.utc), "keys": list(reports_by_key)}
+        ttl_kind = "financials_annual" if timeframe_value == "annual" else "financials_quarterly"
+        self._set_to_cache(latest_key, index, ttl_seconds=self.CACHE_TTL[ttl_kind])
+
+    def invalidate_latest_financials(self, symbols: List[str]) -> int:
+        """
+        Drops the 'latest' report indexes for the given symbols (e.g. when a new filing is published), so the
+        next request refetches the list from Polygon. Per-filing entries are kept. Returns the number of Redis keys deleted.
+        """
+        prefixes = tuple(f"latest:polygon:{_CACHE_KEY_VERSION}:financials:{symbol.upper()}:" for symbol in symbols)
+        if settings.ENABLE_L1_CACHE:
+            with self._L1_LOCK:
+                for key in [k for k in self._L1.keys() if k.startswith(prefixes)]:
+                    self._L1.pop(key, None)
+        if not self.redis or not prefixes:
+            return 0
+        deleted = 0
+        try:
+            for prefix in prefixes:
+                keys = list(self.redis.scan_iter(match=f"{prefix}*"))
+                if keys:
+                    deleted += self.redis.delete(*keys)
+        except RedisError as e:
+            logger.warning(f"Redis error invalidating latest financials for {symbols}: {e}")
+        return deleted
+
+    def fetch_and_upsert_financial_reports(self, symbol: str, timeframe_enum: TimeframeType = TimeframeType.ANNUAL, limit: int = 5) -> List[FinancialReport]:
+        if not self.polygon_client:
+            logger.error(f"Polygon client not initialized. Cannot fetch financials for {symbol}.")
+            return []
+
+        # For a new symbol, fetch the profile concurrently with the financials instead of before them:
+        # cost is max(t_profile, t_financials) rather than the sum. The FK is only needed at write time.
+        company_profile_id = self._get_company_profile_id(symbol)
+        profile_future = self._ensure_profile_async(symbol) if company_profile_id is None else None
+
+        timeframe_value = timeframe_enum.value.lower() # Polygon expects 'annual' or 'quarterly'
+        raw_reports_as_dicts, from_cache = self._fetch_financial_reports_payload(symbol, timeframe_value, limit)
+
+        if profile_future is not None:
+            try:
+                profile_data_dict = profile_future.result(timeout=_PROFILE_PREFETCH_TIMEOUT_SECONDS)
+            except Exception as e:
+                logger.error(f"Profile prefetch for {symbol} failed: {e}", exc_info=True)
+                profile_data_dict = None
+            profile = self._upsert_company_profile(symbol, profile_data_dict) if profile_data_dict else None
+            if not profile:
+                logger.error(f"Company profile for {symbol} not found and could not be fetched. Cannot store financials.")
+                return []
+            company_profile_id = profile.id
+
+        if raw_reports_as_dicts is None:
+            return []
+        return self._store_financial_reports(symbol, company_profile_id, raw_reports_as_dicts, from_cache)
+
+    def fetch_and_upsert_financial_reports_many(self, symbols: List[str], timeframe_enum: TimeframeType = TimeframeType.ANNUAL, limit: int = 5) -> Dict[str, List[FinancialReport]]:
+        """
+        Multi-symbol variant of fetch_and_upsert_financial_reports. Polygon fetches run concurrently
+        (bounded by POLYGON_MAX_CONCURRENCY and the shared rate limiter); DB writes stay on the calling thread.
+        """
+        if not self.polygon_client:
+            logger.error("Polygon client not initialized. Cannot fetch financials.")
+            return {s.upper(): [] for s in symbols}
+
+        # Profile ids for the whole batch in one query; profiles missing from the DB are fetched (cache / Polygon)
+        # in bulk while the reports are fetched, then written with one batched upsert.
+        unique_symbols = list(dict.fromkeys(s.upper() for s in symbols))
+        profile_ids = dict(self.db.execute(self._PROFILE_IDS_BY_SYMBOLS, {"symbols": unique_symbols}).tuples())
+        missing_profiles = [s for s in unique_symbols if s not in profile_ids]
+        profiles_future = _PREFETCH_EXECUTOR.submit(self.fetch_profiles_bulk, missing_profiles) if missing_profiles else None
+
+        timeframe_value = timeframe_enum.value.lower()
+        fetched = self.fetch_many(unique_symbols, lambda s: self._fetch_financial_reports_payload(s, timeframe_value, limit))
+        payloads = {s: result[0] if result else None for s, result in fetched.items()} # None: the fetch itself raised
+        cached_symbols = {s for s, result in fetched.items() if result and result[1]}
+
+        if profiles_future is not None:
+            try:
+                fetched_profiles = profiles_future.result()
+            except Exception as e:
+                logger.error(f"Bulk profile fetch for {missing_profiles} failed: {e}", exc_info=True)
+                fetched_profiles = {}
+            # Only symbols that have reports to store need their profile row
+            to_upsert = {s: p for s, p in fetched_profiles.items() if p and payloads.get(s)}
+            if to_upsert:
+                profile_ids.update(self._upsert_company_profiles(to_upsert))
+
+        results: Dict[str, List[FinancialReport]] = {}
+        for symbol, raw_reports_as_dicts in payloads.items():
+            company_profile_id = profile_ids.get(symbol) if raw_reports_as_dicts else None
+            if raw_reports_as_dicts and company_profile_id is None:
+                logger.error(f"Company profile for {symbol} not found and could not be fetched. Cannot store financials.")
+            results[symbol] = self._store_financial_reports(symbol, company_profile_id, raw_reports_as_dicts, symbol in cached_symbols) if company_profile_id is not None else []
+        return results
+
+    @staticmethod
+    def _report_create_data(symbol: str, company_profile_id: int, report_data_dict: Dict[str, Any], stmt_type_enum: FinancialStatementType, statement_line_items: Dict[str, Any], now_utc: Optional[datetime]) -> Dict[str, Any]:
+        """FinancialReportCreate fields for one statement of a mapped report. Raises ValueError on an unknown timeframe."""
+        return {
+            "company_profile_id": company_profile_id,
+            "symbol": symbol.upper(),
+            "report_type": stmt_type_enum,
+            "timeframe": TimeframeType(report_data_dict["timeframe"]), # Map string to Enum
+            "fiscal_year": report_data_dict.get("fiscal_year"),
+            "fiscal_period": report_data_dict.get("fiscal_period"),
+            "filing_date": report_data_dict.get("filing_date"), # Already dates (parsed at mapping time / msgpack ext)
+            "period_of_report_date": report_data_dict.get("end_date"),
+            "start_date": report_data_dict.get("start_date"),
+            "data": statement_line_items, # Store only the specific statement's data
+            "source_filing_url": report_data_dict.get("source_filing_url"),
+            "source_filing_file_url": report_data_dict.get("source_filing_file_url"),
+            "acceptance_datetime_est": report_data_dict.get("acceptance_datetime"), # Polygon provides this as YYYYMMDDHHMMSS string
+            "last_refreshed": now_utc
+        }
+
+    def _validated_report_dict(self, symbol: str, report_dict: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Validates the report-level fields of a mapped report (shared by every statement row built from it) and
+        returns the report with the coerced values, e.g. fiscal_year as an int. Raises ValueError.
+        """
+        # The FK is only known at write time; any int passes, and the statement data is checked per row on the fresh path
+        validated = _FR_ADAPTER.validate_python(
+            self._report_create_data(symbol, 0, report_dict, FinancialStatementType.INCOME_STATEMENT, {}, None)
+        )
+        coerced = _urls_to_str(dict(validated.__dict__), _FR_URL_FIELDS)
+        return {
+            **report_dict,
+            "fiscal_year": coerced["fiscal_year"],
+            "fiscal_period": coerced["fiscal_period"],
+            "filing_date": coerced["filing_date"],
+            "end_date": coerced["period_of_report_date"],
+            "start_date": coerced["start_date"],
+            "source_filing_url": coerced["source_filing_url"],
+            "source_filing_file_url": coerced["source_filing_file_url"],
+            "acceptance_datetime": coerced["acceptance_datetime_est"],
+        }
+
+    def _iter_financial_report_rows(self, symbol: str, company_profile_id: int, raw_reports_as_dicts: List[Dict[str, Any]], now_utc: datetime, from_cache: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Yields upsert-ready rows (one per statement type per report), de-duplicated on the upsert key. Rows from
+        freshly fetched reports are validated; rows from cached reports were validated before caching and are not.
+        """
+        # An INSERT ... ON CONFLICT cannot touch the same row twice, and Polygon results are sorted
+        # most-recent filing first, so the first occurrence of a key wins.
+        seen_keys = set()
         for report_data_dict in raw_reports_as_dicts:
             financial_statements_from_report = report_data_dict.get("financials", {})
             
@@ -282,71 +974,76 @@ class FinancialDataService:
                     continue
 
                 try:
-                    period_of_report_date = date.fromisoformat(report_data_dict["end_date"])
-                    filing_date_val = date.fromisoformat(report_data_dict["filing_date"])
-                    start_date_val = date.fromisoformat(report_data_dict["start_date"]) if report_data_dict.get("start_date") else None
-
-                    report_create_data = {
-                        "company_profile_id": company_profile_id,
-                        "symbol": symbol.upper(),
-                        "report_type": stmt_type_enum,
-                        "timeframe": TimeframeType(report_data_dict["timeframe"]), # Map string to Enum
-                        "fiscal_year": report_data_dict.get("fiscal_year"),
-                        "fiscal_period": report_data_dict.get("fiscal_period"),
-                        "filing_date": filing_date_val,
-                        "period_of_report_date": period_of_report_date,
-                        "start_date": start_date_val,
-                        "data": statement_line_items, # Store only the specific statement's data
-                        "source_filing_url": report_data_dict.get("source_filing_url"),
-                        "source_filing_file_url": report_data_dict.get("source_filing_file_url"),
-                        "acceptance_datetime_est": report_data_dict.get("acceptance_datetime"), # Polygon provides this as YYYYMMDDHHMMSS string
-                        "last_refreshed": datetime.now(timezone.utc)
-                    }
-                    validated_data = FinancialReportCreate(**report_create_data)
-                except Exception as val_err: # Catch Pydantic validation error or date parsing error
+                    report_create_data = self._report_create_data(symbol, company_profile_id, report_data_dict, stmt_type_enum, statement_line_items, now_utc)
+                    if from_cache: # Validated and coerced on the fetch path before it was cached (see _validated_report_dict)
+                        report_row = dict(FinancialReportCreate.model_construct(**report_create_data).__dict__)
+                    else:
+                        # Flat schema: same content as model_dump() without the rebuild
+                        report_row = _urls_to_str(dict(_FR_ADAPTER.validate_python(report_create_data).__dict__), _FR_URL_FIELDS)
+                except Exception as val_err: # Catch Pydantic validation error (e.g. missing dates) or an unknown timeframe
                     logger.error(f"Validation/Data error for financial report {symbol} {stmt_type_enum.value} for period ending {report_data_dict.get('end_date')}: {val_err}", exc_info=True)
                     continue # Skip this problematic report entry
 
-                # Upsert logic
-                db_report = self.db.query(FinancialReport).filter_by(
-                    company_profile_id=company_profile_id,
-                    report_type=stmt_type_enum,
-                    timeframe=validated_data.timeframe,
-                    period_of_report_date=validated_data.period_of_report_date
-                ).first()
-
-                if db_report:
-                    logger.debug(f"Updating {stmt_type_enum.value} for {symbol} - {validated_data.period_of_report_date}")
-                    for key, value in validated_data.model_dump(exclude_unset=True).items():
-                        if key not in ["company_profile_id", "symbol", "report_type", "timeframe", "period_of_report_date"]: # Don't update PK components
-                             setattr(db_report, key, value)
-                    db_report.last_refreshed = datetime.now(timezone.utc)
-                else:
-                    logger.debug(f"Creating {stmt_type_enum.value} for {symbol} - {validated_data.period_of_report_date}")
-                    db_report = FinancialReport(**validated_data.model_dump())
-                    self.db.add(db_report)
-                
-                try:
-                    self.db.commit()
-                    self.db.refresh(db_report)
-                    stored_db_reports.append(db_report)
-                except Exception as e:
-                    self.db.rollback()
-                    logger.error(f"DB error storing {stmt_type_enum.value} for {symbol} ({validated_data.period_of_report_date}): {e}", exc_info=True)
-        
-        return stored_db_reports
+                upsert_key = tuple(report_row[col] for col in _FINANCIAL_REPORT_UPSERT_KEY)
+                if upsert_key not in seen_keys:
+                    seen_keys.add(upsert_key)
+                    yield report_row
+
+    def _flush_reports(self, rows: List[Dict[str, Any]]) -> List[FinancialReport]:
+        """Upserts a batch of report rows in a single INSERT ... ON CONFLICT statement. Does not commit."""
+        upsert_stmt = pg_insert(FinancialReport).values(rows)
+        upsert_stmt = upsert_stmt.on_conflict_do_update(
+            index_elements=list(_FINANCIAL_REPORT_UPSERT_KEY),
+            set_={key: upsert_stmt.excluded[key] for key in rows[0] if key not in _FINANCIAL_REPORT_IMMUTABLE_COLUMNS},
+        ).returning(FinancialReport)
+        return list(self.db.scalars(upsert_stmt, execution_options={"populate_existing": True}))
+
+    def _store_financial_reports(self, symbol: str, company_profile_id: int, raw_reports_as_dicts: List[Dict[str, Any]], from_cache: bool = False) -> List[FinancialReport]:
+        # Rows are built lazily and upserted in bounded batches (statement size and pending rows stay flat
+        # for large backfills), with one commit at the end so the whole set stays atomic.
+        # The upserts are self-contained statements, so autoflush is suspended: each batch execute would
+        # otherwise scan the identity map (which grows with every RETURNING batch) for pending changes.
+        stored_db_reports: List[FinancialReport] = []
+        batch: List[Dict[str, Any]] = []
+        try:
+            now_utc = datetime.now(timezone.utc) # One refresh time for every row of this write
+            with self.db.no_autoflush:
+                for report_row in self._iter_financial_report_rows(symbol, company_profile_id, raw_reports_as_dicts, now_utc, from_cache):
+                    batch.append(report_row)
+                    if len(batch) >= _REPORT_UPSERT_BATCH_ROWS:
+                        stored_db_reports.extend(self._flush_reports(batch))
+                        batch = []
+                if batch:
+                    stored_db_reports.extend(self._flush_reports(batch))
+            if not stored_db_reports:
+                return []
+            self.db.commit()
+            logger.debug(f"Upserted {len(stored_db_reports)} financial statements for {symbol}.")
+            return stored_db_reports
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"DB error storing financial reports for {symbol}: {e}", exc_info=True)
+            return []
 
     def get_financial_reports_from_db(self, symbol: str, 
                                    report_type: Optional[FinancialStatementType] = None, 
                                    timeframe: Optional[TimeframeType] = None, 
                                    limit: int = 20) -> List[FinancialReport]:
         logger.debug(f"Fetching financial reports for {symbol.upper()} from DB (type: {report_type}, timeframe: {timeframe}).")
-        query = self.db.query(FinancialReport).filter(FinancialReport.symbol == symbol.upper())
-        if report_type:
-            query = query.filter(FinancialReport.report_type == report_type)
-        if timeframe:
-            query = query.filter(FinancialReport.timeframe == timeframe)
-        return query.order_by(FinancialReport.period_of_report_date.desc(), FinancialReport.filing_date.desc()).limit(limit).all()
+        params = {"symbol": symbol.upper(), "report_type": report_type, "timeframe": timeframe, "limit": limit}
+        stmt = self._financial_reports_stmt(bool(report_type), bool(timeframe))
+        return list(self.db.execute(stmt, params).scalars())
+
+    @staticmethod
+    @functools.lru_cache(maxsize=4)
+    def _financial_reports_stmt(by_report_type: bool, by_timeframe: bool):
+        """get_financial_reports_from_db statement for each combination of optional filters, built once."""
+        stmt = select(FinancialReport).where(FinancialReport.symbol == bindparam("symbol")).options(*FinancialDataService._NO_LAZY_LOADS)
+        if by_report_type:
+            stmt = stmt.where(FinancialReport.report_type == bindparam("report_type"))
+        if by_timeframe:
+            stmt = stmt.where(FinancialReport.timeframe == bindparam("timeframe"))
+        return stmt.order_by(FinancialReport.period_of_report_date.desc(), FinancialReport.filing_date.desc()).limit(bindparam("limit"))
 
 
     # --- Key Ratios Methods ---
@@ -357,35 +1054,30 @@ class FinancialDataService:
         If effective_date is None, uses the date of the latest available financials.
         """
         symbol_upper = symbol.upper()
+        memo_key = (symbol_upper, effective_date) # effective_date=None ("latest") is memoized as its own key
+        memoized = self._ratios_memo.get(memo_key)
+        if memoized is not None:
+            return memoized
+        now_utc = datetime.now(timezone.utc) # Freshness check and last_refreshed use the same instant
         if not effective_date:
-            # Try to find the date of the latest annual financial report
-            latest_annual_report = self.db.query(FinancialReport.period_of_report_date)\
-                .filter(FinancialReport.symbol == symbol_upper, FinancialReport.timeframe == TimeframeType.ANNUAL)\
-                .order_by(desc(FinancialReport.period_of_report_date))\
-                .first()
-            if latest_annual_report:
-                effective_date = latest_annual_report[0]
-            else: # Fallback to latest quarterly if no annual
-                latest_quarterly_report = self.db.query(FinancialReport.period_of_report_date)\
-                    .filter(FinancialReport.symbol == symbol_upper, FinancialReport.timeframe == TimeframeType.QUARTERLY)\
-                    .order_by(desc(FinancialReport.period_of_report_date))\
-                    .first()
-                if latest_quarterly_report:
-                    effective_date = latest_quarterly_report[0]
-                else: # Fallback to today if no financials found to determine effective_date
-                    effective_date = date.today()
+            # Date of the latest annual financial report, falling back to the latest quarterly if there is no
+            # annual one - resolved in a single query by ranking annual rows first.
+            effective_date = self.db.scalar(self._LATEST_REPORT_DATE, {"symbol": symbol_upper})
+            if effective_date is None: # Fallback to today if no financials found to determine effective_date
+                effective_date = date.today()
         
         logger.info(f"Getting/Calculating key ratios for {symbol_upper} effective {effective_date}.")
 
         # Check if ratios for this symbol and date (or period_type) already exist
-        existing_ratios = self.db.query(KeyRatioSet).filter_by(
+        existing_ratios = self.db.query(KeyRatioSet).options(*self._NO_LAZY_LOADS).filter_by(
             symbol=symbol_upper,
             date=effective_date 
             # Potentially also filter by period_type if you store ratios for different timeframes on the same date
         ).first()
 
-        if existing_ratios and (datetime.now(timezone.utc) - (existing_ratios.last_refreshed or datetime.min.replace(tzinfo=timezone.utc))).days < 30: # Example: refresh if older than 30 days
+        if existing_ratios and (now_utc - (existing_ratios.last_refreshed or datetime.min.replace(tzinfo=timezone.utc))).days < 30: # Example: refresh if older than 30 days
             logger.info(f"Returning existing, recent key ratios for {symbol_upper} on {effective_date}.")
+            self._ratios_memo[memo_key] = existing_ratios
             return existing_ratios
 
         # --- Data Gathering for Ratio Calculation ---
@@ -394,134 +1086,93 @@ class FinancialDataService:
             logger.warning(f"Cannot calculate ratios for {symbol_upper}: Company profile not found.")
             return None
 
-        # Fetch latest annual and quarterly financials (most recent ones up to the effective_date)
-        annual_income_stmt = self._get_latest_financial_statement(symbol_upper, FinancialStatementType.INCOME_STATEMENT, TimeframeType.ANNUAL, effective_date)
-        annual_balance_sheet = self._get_latest_financial_statement(symbol_upper, FinancialStatementType.BALANCE_SHEET, TimeframeType.ANNUAL, effective_date)
+        # The live price is a network call; start it once we know it's needed, so it overlaps the statement read below.
+        price_future = _PREFETCH_EXECUTOR.submit(get_current_market_price, symbol_upper, self.trading_service)
+
+        # Fetch latest annual financials (most recent ones up to the effective_date) in one query
+        latest_statements = self._get_latest_financial_statements(
+            symbol_upper,
+            (FinancialStatementType.INCOME_STATEMENT, FinancialStatementType.BALANCE_SHEET),
+            TimeframeType.ANNUAL,
+            effective_date,
+        )
+        annual_income_stmt = latest_statements.get(FinancialStatementType.INCOME_STATEMENT)
+        annual_balance_sheet = latest_statements.get(FinancialStatementType.BALANCE_SHEET)
         
         # TTM (Trailing Twelve Months) data often needs to be summed from last 4 quarters
         # For simplicity, we'll use latest annual for some ratios, or you could implement TTM calculation.
         # EPS often comes directly from income statement (diluted_earnings_per_share)
 
-        ratios_dict: Dict[str, Optional[float]] = {
-            "price_to_earnings_ratio": None, "price_to_sales_ratio": None, "price_to_book_ratio": None,
-            "earnings_per_share": None, "dividend_yield": None, "return_on_equity": None,
-            "debt_to_equity_ratio": None, "current_ratio": None, "quick_ratio": None,
-            "gross_profit_margin": None, "operating_profit_margin": None, "net_profit_margin": None,
-        }
-
         # --- Ratio Calculations ---
-        current_price = get_current_market_price(symbol_upper, self.trading_service)
-
-        # Earnings Per Share (EPS) - often directly from income statement
-        if annual_income_stmt and annual_income_stmt.data:
-            # Polygon.io path: financials.income_statement.diluted_earnings_per_share.value
-            eps_value = annual_income_stmt.data.get("diluted_earnings_per_share") or \
-                        annual_income_stmt.data.get("basic_earnings_per_share")
-            if isinstance(eps_value, (int, float)):
-                ratios_dict["earnings_per_share"] = float(eps_value)
-
-        # Price-to-Earnings (P/E)
-        if current_price and ratios_dict["earnings_per_share"] and ratios_dict["earnings_per_share"] != 0:
-            ratios_dict["price_to_earnings_ratio"] = current_price / ratios_dict["earnings_per_share"]
-
-        # Revenue, Net Income, Gross Profit, Operating Income
-        total_revenue, net_income, gross_profit, operating_income = None, None, None, None
-        if annual_income_stmt and annual_income_stmt.data:
-            total_revenue = annual_income_stmt.data.get("revenues") # Polygon: financials.income_statement.revenues.value
-            net_income = annual_income_stmt.data.get("net_income_loss") # Polygon: financials.income_statement.net_income_loss.value
-            gross_profit = annual_income_stmt.data.get("gross_profit") # Polygon: financials.income_statement.gross_profit.value
-            operating_income = annual_income_stmt.data.get("operating_income_loss") # Polygon: financials.income_statement.operating_income_loss.value
-
-        # Price-to-Sales (P/S)
-        if current_price and profile and profile.shares_outstanding and total_revenue and profile.shares_outstanding !=0:
-            sales_per_share = total_revenue / profile.shares_outstanding
-            if sales_per_share != 0:
-                ratios_dict["price_to_sales_ratio"] = current_price / sales_per_share
-        
-        # Margins
-        if total_revenue and total_revenue != 0:
-            if gross_profit is not None:
-                ratios_dict["gross_profit_margin"] = gross_profit / total_revenue
-            if operating_income is not None:
-                ratios_dict["operating_profit_margin"] = operating_income / total_revenue
-            if net_income is not None:
-                ratios_dict["net_profit_margin"] = net_income / total_revenue
-
-        # Balance Sheet items
-        total_assets, total_liabilities, total_equity, current_assets, current_liabilities, cash_and_equivalents, inventory = \
-            None, None, None, None, None, None, None
-        if annual_balance_sheet and annual_balance_sheet.data:
-            total_assets = annual_balance_sheet.data.get("assets") # Polygon: financials.balance_sheet.assets.value
-            total_liabilities = annual_balance_sheet.data.get("liabilities") # Polygon: financials.balance_sheet.liabilities.value
-            total_equity = annual_balance_sheet.data.get("equity") # Polygon: financials.balance_sheet.equity.value
-            current_assets = annual_balance_sheet.data.get("current_assets") # Polygon: financials.balance_sheet.current_assets.value
-            current_liabilities = annual_balance_sheet.data.get("current_liabilities") # Polygon: financials.balance_sheet.current_liabilities.value
-            cash_and_equivalents = annual_balance_sheet.data.get("cash_and_cash_equivalents_at_carrying_value") # Example path
-            inventory = annual_balance_sheet.data.get("inventory") # Example path
-
-        # Debt-to-Equity (D/E)
-        if total_liabilities is not None and total_equity is not None and total_equity != 0:
-            ratios_dict["debt_to_equity_ratio"] = total_liabilities / total_equity
-
-        # Price-to-Book (P/B)
-        if current_price and profile and profile.shares_outstanding and total_equity and profile.shares_outstanding != 0:
-            book_value_per_share = total_equity / profile.shares_outstanding
-            if book_value_per_share != 0:
-                ratios_dict["price_to_book_ratio"] = current_price / book_value_per_share
-        
-        # Return on Equity (ROE)
-        if net_income is not None and total_equity is not None and total_equity != 0:
-            ratios_dict["return_on_equity"] = net_income / total_equity
-            
-        # Current Ratio
-        if current_assets is not None and current_liabilities is not None and current_liabilities != 0:
-            ratios_dict["current_ratio"] = current_assets / current_liabilities
-
-        # Quick Ratio (Acid Test)
-        if current_assets is not None and inventory is not None and current_liabilities is not None and current_liabilities != 0:
-            ratios_dict["quick_ratio"] = (current_assets - inventory) / current_liabilities
+        try:
+            current_price = price_future.result(timeout=_PRICE_PREFETCH_TIMEOUT_SECONDS)
+        except Exception as e:
+            logger.warning(f"Could not get live price for {symbol_upper}: {e}")
+            current_price = None
 
-        # Dividend Yield - Requires dividend data, not easily available from just financials/profile.
-        # For now, will leave as None. Polygon.io has a separate Dividends API.
+        ratios_dict = _compute_ratios(self._ratio_inputs(profile, annual_income_stmt, annual_balance_sheet, current_price))
 
         # --- Store Calculated Ratios ---
-        if existing_ratios:
-            logger.info(f"Updating existing key ratios for {symbol_upper} on {effective_date}.")
-            for key, value in ratios_dict.items():
-                if hasattr(existing_ratios, key): # Check if the attribute exists on the model
-                    setattr(existing_ratios, key, value)
-            existing_ratios.last_refreshed = datetime.now(timezone.utc)
-            db_ratio_set = existing_ratios
-        else:
-            logger.info(f"Creating new key ratios set for {symbol_upper} on {effective_date}.")
-            # Ensure all required fields for KeyRatioSetCreate are present
-            key_ratio_create_data = KeyRatioSetCreate(
-                company_profile_id=profile.id,
-                symbol=symbol_upper,
-                date=effective_date,
-                period_type=TimeframeType.ANNUAL, # Assuming annual for now based on data used
-                **ratios_dict # Unpack calculated ratios
-            )
-            db_ratio_set = KeyRatioSet(**key_ratio_create_data.model_dump())
-            db_ratio_set.last_refreshed = datetime.now(timezone.utc)
-            self.db.add(db_ratio_set)
+        # A single INSERT ... ON CONFLICT covers both the new and the stale-refresh case, atomically: two
+        # concurrent calculations for the same symbol/date can't both insert.
+        logger.info(f"Storing key ratios set for {symbol_upper} on {effective_date} ({'refresh' if existing_ratios else 'new'}).")
+        ratio_values = KeyRatioSetCreate(
+            company_profile_id=profile.id,
+            symbol=symbol_upper,
+            date=effective_date,
+            period_type=TimeframeType.ANNUAL, # Assuming annual for now based on data used
+            **ratios_dict # Unpack calculated ratios
+        ).model_dump()
+        ratio_values["last_refreshed"] = now_utc
+        upsert_stmt = pg_insert(KeyRatioSet).values(**ratio_values)
+        upsert_stmt = upsert_stmt.on_conflict_do_update(
+            index_elements=list(_KEY_RATIO_UPSERT_KEY),
+            set_={key: upsert_stmt.excluded[key] for key in ratio_values if key not in _KEY_RATIO_UPSERT_KEY},
+        ).returning(KeyRatioSet)
 
         try:
+            db_ratio_set = self.db.scalars(upsert_stmt, execution_options={"populate_existing": True}).one()
             self.db.commit()
-            self.db.refresh(db_ratio_set)
             logger.info(f"Successfully calculated and stored/updated key ratios for {symbol_upper} on {effective_date}.")
+            self._ratios_memo[memo_key] = db_ratio_set
             return db_ratio_set
         except Exception as e:
             self.db.rollback()
             logger.error(f"DB error storing key ratios for {symbol_upper}: {e}", exc_info=True)
             return None
 
+    @staticmethod
+    def _ratio_inputs(profile: CompanyProfile, income_stmt: Optional[FinancialReport], balance_sheet: Optional[FinancialReport], current_price: Optional[float]) -> Dict[str, Any]:
+        """Collects the raw figures _compute_ratios needs; absent items are None."""
+        income = (income_stmt.data if income_stmt else None) or {}
+        balance = (balance_sheet.data if balance_sheet else None) or {}
+        return {
+            "price": current_price,
+            "shares_outstanding": profile.shares_outstanding,
+            # Polygon.io path: financials.income_statement.diluted_earnings_per_share.value
+            "eps": income.get("diluted_earnings_per_share") or income.get("basic_earnings_per_share"),
+            "revenue": income.get("revenues"),
+            "net_income": income.get("net_income_loss"),
+            "gross_profit": income.get("gross_profit"),
+            "operating_income": income.get("operating_income_loss"),
+            "total_liabilities": balance.get("liabilities"), # Polygon: financials.balance_sheet.liabilities.value
+            "total_equity": balance.get("equity"),
+            "current_assets": balance.get("current_assets"),
+            "current_liabilities": balance.get("current_liabilities"),
+            "inventory": balance.get("inventory"),
+        }
+
     def _get_latest_financial_statement(self, symbol: str, stmt_type: FinancialStatementType, timeframe: TimeframeType, effective_date: date) -> Optional[FinancialReport]:
         """Helper to get the most recent financial statement of a specific type and timeframe on or before an effective date."""
-        return self.db.query(FinancialReport)\
-            .filter(FinancialReport.symbol == symbol,
-                    FinancialReport.report_type == stmt_type,
-                    FinancialReport.timeframe == timeframe,
-                    FinancialReport.period_of_report_date <= effective_date)\
-            .order_by(desc(FinancialReport.period_of_report_date))\
-            .first()
\ No newline at end of file
+        return self.db.execute(self._LATEST_STATEMENTS, {
+            "symbol": symbol, "stmt_types": [stmt_type], "timeframe": timeframe,
+            "effective_date": effective_date, "limit": 1,
+        }).scalar_one_or_none()
+
+    def _get_latest_financial_statements(self, symbol: str, stmt_types: tuple, timeframe: TimeframeType, effective_date: date) -> Dict[FinancialStatementType, FinancialReport]:
+        """Most recent statement per requested type on or before effective_date, fetched with a single query."""
+        rows = self.db.execute(self._LATEST_STATEMENT_PER_TYPE, {
+            "symbol": symbol, "stmt_types": list(stmt_types), "timeframe": timeframe,
+            "effective_date": effective_date,
+        }).scalars()
+        return {row.report_type: row for row in rows}
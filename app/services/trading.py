@@ -1,13 +1,18 @@
 import alpaca_trade_api as tradeapi
 from alpaca_trade_api.rest import APIError
+from requests.adapters import HTTPAdapter
 from typing import Dict, List, Optional, Any
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import hashlib
+import threading
 import pandas as pd
 from sqlalchemy.orm import Session
 import redis
 from redis.exceptions import RedisError
-import json
-from json.decoder import JSONDecodeError
+from cachetools import TTLCache, cached
+import orjson
 import logging
 import numpy as np # Added for backtest_strategy
 
@@ -22,7 +27,10 @@ logger = logging.getLogger(__name__)
 # Initialize Redis client and ML Engine
 # For production, consider dependency injection for these for better testability
 try:
-    r = redis.from_url(settings.REDIS_URL, decode_responses=True)
+    # Bounded pool shared by the request threads and the Alpaca executor: at most 64 sockets to Redis, and a
+    # burst beyond that waits briefly for a free connection instead of opening (or failing) a new one.
+    r = redis.Redis(connection_pool=redis.BlockingConnectionPool.from_url(
+        settings.REDIS_URL, max_connections=64, timeout=5, decode_responses=True))
     r.ping() # Check connection
     logger.info("Successfully connected to Redis.")
 except RedisError as e:
@@ -32,6 +40,75 @@ except RedisError as e:
 
 ml_engine = MLEngine()
 
+# Threads for overlapping independent Alpaca REST calls (e.g. account and quote before sizing a trade).
+# The calls are blocking HTTP, so threads let them wait on the network concurrently.
+_ALPACA_MAX_WORKERS = 16
+_alpaca_executor = ThreadPoolExecutor(max_workers=_ALPACA_MAX_WORKERS, thread_name_prefix="alpaca")
+
+
+def _prediction_cache_key(symbol: str, model_type: str) -> str:
+    return f"prediction:{symbol}:{model_type}"
+
+# In-process L1 for predictions in front of Redis: repeated trades on a symbol within a few seconds are served
+# from memory. Entries are the decoded dicts, so callers must treat them as read-only.
+_local_prediction_cache = TTLCache(maxsize=4096, ttl=min(settings.PREDICTION_CACHE_TTL, 5))
+_local_prediction_lock = threading.Lock()
+
+def _get_local_prediction(cache_key: str) -> Optional[Dict[str, Any]]:
+    if not settings.ENABLE_L1_CACHE:
+        return None
+    with _local_prediction_lock:
+        return _local_prediction_cache.get(cache_key)
+
+def _set_local_prediction(cache_key: str, prediction_data: Dict[str, Any]) -> None:
+    if settings.ENABLE_L1_CACHE:
+        with _local_prediction_lock:
+            _local_prediction_cache[cache_key] = prediction_data
+
+# Short-lived Alpaca snapshots shared by bursts of trades (cache-aside in Redis). Equity and quotes do move
+# intraday, but not meaningfully within these windows, and each hit saves a REST round-trip and API quota.
+_ACCOUNT_CACHE_TTL_SECONDS = 3
+_QUOTE_CACHE_TTL_MS = 500
+
+@dataclass(frozen=True, slots=True)
+class _SymbolTradingParams:
+    """Per-symbol order constraints, resolved once from the Alpaca asset and reused for every trade."""
+    fractionable: bool
+    qty_precision: int # Decimal places allowed for the order quantity
+
+# Asset attributes are the same for every account and rarely change: share them across service instances,
+# keyed by symbol only (the API client just performs the lookup), and refresh daily.
+@cached(cache=TTLCache(maxsize=4096, ttl=24 * 3600), key=lambda api, symbol: symbol, lock=threading.Lock())
+def _symbol_trading_params(api: tradeapi.REST, symbol: str) -> _SymbolTradingParams:
+    fractionable = bool(getattr(api.get_asset(symbol), "fractionable", False))
+    return _SymbolTradingParams(fractionable=fractionable, qty_precision=6 if fractionable else 0)
+
+def _quote_cache_key(symbol: str) -> str:
+    return f"quote:{symbol}"
+
+def _get_cached_quotes(symbols: List[str]) -> Dict[str, float]:
+    """Cached latest prices for the symbols that have one, read with a single MGET."""
+    if not r or not symbols:
+        return {}
+    try:
+        cached_values = r.mget([_quote_cache_key(symbol) for symbol in symbols])
+    except RedisError as e:
+        logger.warning(f"Redis error getting cached quotes: {e}")
+        return {}
+    return {symbol: float(value) for symbol, value in zip(symbols, cached_values) if value is not None}
+
+def _cache_quotes(prices: Dict[str, Optional[float]]) -> None:
+    if not r:
+        return
+    try:
+        pipe = r.pipeline(transaction=False)
+        for symbol, price in prices.items():
+            if price is not None:
+                pipe.set(_quote_cache_key(symbol), price, px=_QUOTE_CACHE_TTL_MS)
+        pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Redis error caching quotes: {e}")
+
 
 class TradingService:
     """
@@ -48,9 +125,14 @@ class TradingService:
             secret_key: Alpaca API secret key.
             base_url: Alpaca API base URL (e.g., paper or live).
         """
+        # Account snapshots are cached per set of credentials; the key never contains the credentials themselves
+        self._account_cache_key = f"alpaca:account:{hashlib.sha256(f'{base_url}|{api_key}'.encode()).hexdigest()[:32]}"
         try:
             self.api = tradeapi.REST(api_key, secret_key, base_url)
-            self.api.get_account() # Verify API credentials and connection
+            # The SDK's requests.Session keeps only 10 connections per host by default; with more concurrent
+            # calls than that, the extra connections are discarded and each later call pays a new TCP+TLS handshake.
+            self.api._session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=_ALPACA_MAX_WORKERS * 2))
+            self._cache_account(self.api.get_account()._raw) # Verify API credentials and connection (and reuse the result)
             logger.info("Successfully connected to Alpaca API.")
         except APIError as e:
             logger.error(f"Failed to connect to Alpaca API or authenticate: {e}")
@@ -60,9 +142,26 @@ class TradingService:
             logger.error(f"An unexpected error occurred during Alpaca API initialization: {e}")
             self.api = None
 
+    def _cache_account(self, account: Dict[str, Any]) -> None:
+        if not r:
+            return
+        try:
+            r.setex(self._account_cache_key, _ACCOUNT_CACHE_TTL_SECONDS, orjson.dumps(account))
+        except RedisError as e:
+            logger.warning(f"Redis error caching account snapshot: {e}")
+
+    def _invalidate_account(self) -> None:
+        if not r:
+            return
+        try:
+            r.delete(self._account_cache_key)
+        except RedisError as e:
+            logger.warning(f"Redis error invalidating account snapshot: {e}")
+
     def get_account(self) -> Optional[Dict[str, Any]]:
         """
         Retrieves current Alpaca account information.
+        Served from a snapshot up to a few seconds old when one is cached.
 
         Returns:
             A dictionary containing account details, or None if an API error occurs.
@@ -70,8 +169,17 @@ class TradingService:
         if not self.api:
             logger.error("Alpaca API client not initialized.")
             return None
+        if r:
+            try:
+                cached_account = r.get(self._account_cache_key)
+                if cached_account:
+                    return orjson.loads(cached_account)
+            except (RedisError, orjson.JSONDecodeError) as e:
+                logger.warning(f"Error reading cached account snapshot: {e}")
         try:
-            return self.api.get_account()._raw
+            account = self.api.get_account()._raw
+            self._cache_account(account)
+            return account
         except APIError as e:
             logger.error(f"Alpaca API error getting account: {e}")
             return None
@@ -103,15 +211,17 @@ class TradingService:
             logger.error("Alpaca API client not initialized.")
             return []
         try:
-            positions = self.api.list_positions()
+            # Raw JSON rows straight from the endpoint list_positions() wraps: no SDK Position entity per row,
+            # whose every attribute read goes through __getattr__ into the same dict.
+            positions = self.api.get('/positions')
             return [{
-                'symbol': pos.symbol,
-                'qty': float(pos.qty),
-                'avg_entry_price': float(pos.avg_entry_price),
-                'current_price': float(pos.current_price),
-                'market_value': float(pos.market_value),
-                'unrealized_pl': float(pos.unrealized_pl),
-                'unrealized_pl_percent': float(pos.unrealized_plpc), # assuming 'unrealized_plpc' is correct
+                'symbol': pos['symbol'],
+                'qty': float(pos['qty']),
+                'avg_entry_price': float(pos['avg_entry_price']),
+                'current_price': float(pos['current_price']),
+                'market_value': float(pos['market_value']),
+                'unrealized_pl': float(pos['unrealized_pl']),
+                'unrealized_pl_percent': float(pos['unrealized_plpc']), # assuming 'unrealized_plpc' is correct
             } for pos in positions]
         except APIError as e:
             logger.error(f"Alpaca API error getting positions: {e}")
@@ -133,9 +243,14 @@ class TradingService:
         if not self.api:
             logger.error("Alpaca API client not initialized.")
             return None
+        cached_price = _get_cached_quotes([symbol]).get(symbol)
+        if cached_price is not None:
+            return cached_price
         try:
             quote = self.api.get_latest_quote(symbol)
-            return float(quote.ap) # 'ap' is typically ask price
+            price = float(quote.ap) # 'ap' is typically ask price
+            _cache_quotes({symbol: price})
+            return price
         except APIError as e:
             logger.error(f"Alpaca API error getting latest price for {symbol}: {e}")
             return None
@@ -143,7 +258,43 @@ class TradingService:
             logger.error(f"Unexpected error getting latest price for {symbol}: {e}")
             return None
 
-    def calculate_position_size(self, symbol: str, risk_per_trade: float = 0.01) -> Optional[float]:
+    def get_latest_prices(self, symbols: List[str]) -> Dict[str, Optional[float]]:
+        """
+        Retrieves the latest ask price for several symbols with a single multi-symbol quote request.
+
+        Args:
+            symbols: The stock symbols (e.g., ["AAPL", "MSFT"]).
+
+        Returns:
+            A dictionary mapping each symbol to its latest ask price, or None where no quote was returned
+            (all None if an error occurs).
+        """
+        if not self.api:
+            logger.error("Alpaca API client not initialized.")
+            return {symbol: None for symbol in symbols}
+        prices: Dict[str, Optional[float]] = _get_cached_quotes(symbols)
+        missing = [symbol for symbol in symbols if symbol not in prices]
+        if not missing:
+            return prices
+        try:
+            quotes = self.api.get_latest_quotes(missing)
+            fetched = {symbol: float(quotes[symbol].ap) if symbol in quotes else None for symbol in missing}
+            _cache_quotes(fetched)
+            prices.update(fetched)
+            return prices
+        except APIError as e:
+            logger.error(f"Alpaca API error getting latest prices for {len(symbols)} symbols: {e}")
+            return {symbol: None for symbol in symbols}
+        except Exception as e:
+            logger.error(f"Unexpected error getting latest prices for {len(symbols)} symbols: {e}")
+            return {symbol: None for symbol in symbols}
+
+    def calculate_position_size(self,
+                                symbol: str,
+                                risk_per_trade: float = 0.01,
+                                portfolio_value: Optional[float] = None,
+                                current_price: Optional[float] = None,
+                                allow_fractional: bool = True) -> Optional[float]:
         """
         Calculates the position size based on a fixed risk percentage of portfolio equity.
         TODO: Implement more advanced position sizing models (e.g., Kelly Criterion, volatility-based).
@@ -151,17 +302,23 @@ class TradingService:
         Args:
             symbol: The stock symbol.
             risk_per_trade: The fraction of portfolio equity to risk on this trade (e.g., 0.01 for 1%).
+            portfolio_value: Portfolio equity, if the caller already fetched it. Fetched from Alpaca otherwise.
+            current_price: Latest price, if the caller already fetched it. Fetched from Alpaca otherwise.
+            allow_fractional: Size in fractional shares when the asset supports it. Pass False where Alpaca
+                only accepts whole shares (e.g. short sales).
 
         Returns:
-            The calculated quantity of shares to trade, rounded to a sensible precision,
+            The calculated quantity of shares to trade, rounded to the symbol's quantity precision,
             or None if an error occurs.
         """
-        portfolio_value = self.get_portfolio_value()
+        if portfolio_value is None:
+            portfolio_value = self.get_portfolio_value()
         if portfolio_value is None:
             logger.error("Could not retrieve portfolio value for position sizing.")
             return None
 
-        current_price = self.get_latest_price(symbol)
+        if current_price is None:
+            current_price = self.get_latest_price(symbol)
         if current_price is None or current_price == 0:
             logger.error(f"Could not retrieve valid price for {symbol} for position sizing.")
             return None
@@ -169,10 +326,13 @@ class TradingService:
         risk_amount = portfolio_value * risk_per_trade
         quantity = risk_amount / current_price
         
-        # TODO: Adjust rounding precision based on asset type or minimum order size.
-        # For typical stocks, 0 decimal places for quantity might be appropriate if fractional shares are not allowed.
-        # If fractional shares are allowed by Alpaca for the symbol, adjust precision accordingly.
-        return round(quantity, 0) # Example: Round to whole shares
+        qty_precision = 0 # Whole shares unless the asset is known to be fractionable
+        if allow_fractional:
+            try:
+                qty_precision = _symbol_trading_params(self.api, symbol).qty_precision
+            except Exception as e:
+                logger.warning(f"Could not look up trading parameters for {symbol}, sizing in whole shares: {e}")
+        return round(quantity, qty_precision)
 
     def place_order(self,
                       symbol: str,
@@ -211,6 +371,7 @@ class TradingService:
                 stop_price=stop_price
             )
             logger.info(f"Order submitted for {symbol}: {side} {qty} shares @ {order_type}. Order ID: {order.id}")
+            self._invalidate_account() # Cash / buying power change with the order
             return order._raw
         except APIError as e:
             logger.error(f"Alpaca API error placing order for {symbol} ({side} {qty}): {e}")
@@ -225,7 +386,11 @@ class TradingService:
                         model_type: str,
                         user_id: int, # Assuming Trade model requires user_id
                         confidence_threshold: float = 0.7, # Example: configurable threshold
-                        risk_per_trade: float = 0.01
+                        risk_per_trade: float = 0.01,
+                        current_price: Optional[float] = None,
+                        portfolio_value: Optional[float] = None,
+                        prediction_data: Optional[Dict[str, Any]] = None,
+                        commit: bool = True
                         ) -> Dict[str, Any]:
         """
         Executes a trade based on an ML model prediction.
@@ -239,36 +404,46 @@ class TradingService:
             user_id: The ID of the user initiating the trade.
             confidence_threshold: Minimum model confidence to execute the trade.
             risk_per_trade: Risk percentage for position sizing.
+            current_price: Latest price, if already fetched (e.g. by execute_trades). Fetched from Alpaca otherwise.
+            portfolio_value: Portfolio equity, if already fetched. Fetched from Alpaca otherwise.
+            prediction_data: Cached prediction, if already read (e.g. by execute_trades). Looked up otherwise.
+            commit: Commit the trade log right away. When False (batches), the row is flushed inside a savepoint
+                so it gets its ID, and the caller commits the whole batch once.
 
         Returns:
             A dictionary containing the trade execution status and details.
         """
-        prediction_data: Optional[Dict[str, Any]] = None
-        cache_key = f"prediction:{symbol}:{model_type}"
+        cache_key = _prediction_cache_key(symbol, model_type)
+
+        if prediction_data is None:
+            prediction_data = _get_local_prediction(cache_key)
 
-        if r: # Check if Redis client is available
+        if prediction_data is None and r: # Check if Redis client is available
             try:
-                if r.exists(cache_key):
-                    cached_value = r.get(cache_key)
-                    if cached_value:
-                        prediction_data = json.loads(cached_value)
-                        logger.info(f"Retrieved prediction for {symbol} ({model_type}) from cache.")
+                cached_value = r.get(cache_key) # A single GET: None already means a miss, no EXISTS needed
+                if cached_value:
+                    prediction_data = orjson.loads(cached_value)
+                    _set_local_prediction(cache_key, prediction_data)
+                    logger.info(f"Retrieved prediction for {symbol} ({model_type}) from cache.")
             except RedisError as e:
                 logger.warning(f"Redis error checking/getting cache for {cache_key}: {e}")
-            except JSONDecodeError as e:
+            except orjson.JSONDecodeError as e:
                 logger.warning(f"Failed to decode cached JSON for {cache_key}: {e}. Fetching new prediction.")
                 prediction_data = None # Force refresh
 
         if prediction_data is None:
             logger.info(f"No valid cache for {symbol} ({model_type}). Fetching new prediction.")
             prediction_data = ml_engine.predict(symbol, model_type=model_type)
+            if prediction_data and "error" not in prediction_data:
+                _set_local_prediction(cache_key, prediction_data)
             if r and prediction_data and "error" not in prediction_data:
                 try:
-                    r.setex(cache_key, settings.PREDICTION_CACHE_TTL, json.dumps(prediction_data))
+                    # Still JSON (the /predict endpoint reads the same keys), but encoded in C and numpy-aware
+                    r.setex(cache_key, settings.PREDICTION_CACHE_TTL, orjson.dumps(prediction_data, option=orjson.OPT_SERIALIZE_NUMPY))
                     logger.info(f"Cached new prediction for {symbol} ({model_type}).")
                 except RedisError as e:
                     logger.warning(f"Redis error setting cache for {cache_key}: {e}")
-                except (TypeError, OverflowError) as serialization_error:
+                except orjson.JSONEncodeError as serialization_error:
                      logger.error(f"Failed to serialize prediction_data for caching {cache_key}: {serialization_error}")
 
 
@@ -284,7 +459,13 @@ class TradingService:
             logger.info(f"Trade for {symbol} skipped. Confidence {confidence:.2f} < threshold {confidence_threshold:.2f}.")
             return {"status": "skipped", "message": "Confidence below threshold"}
 
-        current_price = self.get_latest_price(symbol)
+        # Account equity and the latest quote are independent round-trips: fetch whichever the caller didn't
+        # provide concurrently, and hand both to position sizing so it doesn't fetch them again.
+        portfolio_value_future = _alpaca_executor.submit(self.get_portfolio_value) if portfolio_value is None else None
+        if current_price is None:
+            current_price = self.get_latest_price(symbol)
+        if portfolio_value_future is not None:
+            portfolio_value = portfolio_value_future.result()
         if current_price is None:
             logger.error(f"Could not get current price for {symbol}. Skipping trade.")
             return {"status": "error", "message": "Failed to get current price."}
@@ -293,7 +474,9 @@ class TradingService:
         # TODO: This logic might be too simple. A robust strategy would consider more factors.
         direction = "buy" if predicted_price > current_price else "sell"
 
-        qty = self.calculate_position_size(symbol, risk_per_trade=risk_per_trade)
+        qty = self.calculate_position_size(symbol, risk_per_trade=risk_per_trade,
+                                           portfolio_value=portfolio_value, current_price=current_price,
+                                           allow_fractional=direction == "buy") # Alpaca rejects fractional short sales
         if qty is None or qty <= 0:
             logger.warning(f"Invalid or zero quantity ({qty}) calculated for {symbol}. Skipping trade.")
             return {"status": "skipped", "message": "Invalid or zero quantity for trade."}
@@ -308,26 +491,115 @@ class TradingService:
                     side=direction,
                     quantity=qty,
                     price=current_price,  # Note: This is the price at decision time, not necessarily fill price for market orders.
-                    timestamp=datetime.utcnow(),
+                    timestamp=datetime.now(timezone.utc),
                     confidence=confidence,
                     predicted_price=predicted_price,
                     model_used=model_type,
                     order_id=order_response.get("id") # Ensure your Trade model has an order_id field
                     # TODO: Add other relevant fields to your Trade model and populate them here.
                 )
-                db.add(trade)
-                db.commit()
-                db.refresh(trade) # To get ID or other db-generated fields
+                if commit:
+                    db.add(trade)
+                    db.commit()
+                    db.refresh(trade) # To get ID or other db-generated fields
+                else:
+                    # Releasing the savepoint flushes the INSERT (assigning the ID); a failure only undoes this row
+                    with db.begin_nested():
+                        db.add(trade)
                 logger.info(f"Trade for {symbol} executed and logged. Order ID: {order_response.get('id')}, DB Trade ID: {trade.id}")
                 return {"status": "success", "order": order_response, "trade_log_id": trade.id}
             except Exception as e: # Catch potential DB errors
                 logger.error(f"Database error logging trade for {symbol}: {e}")
-                db.rollback()
+                if commit: # In a batch the savepoint has already been rolled back; keep the other rows
+                    db.rollback()
                 return {"status": "error", "message": f"DB error: {e}", "order": order_response}
         else:
             logger.error(f"Failed to place order for {symbol}.")
             return {"status": "error", "message": "Order placement failed."}
 
+    def execute_trades(self,
+                       db: Session,
+                       symbols: List[str],
+                       model_type: str,
+                       user_id: int,
+                       confidence_threshold: float = 0.7,
+                       risk_per_trade: float = 0.01
+                       ) -> Dict[str, Dict[str, Any]]:
+        """
+        Multi-symbol version of execute_trade. Account equity is fetched once and all quotes with a single
+        multi-symbol request, instead of one of each per symbol, and the trade logs are committed in one
+        transaction instead of one commit per trade.
+
+        Args:
+            db: SQLAlchemy database session.
+            symbols: The stock symbols to trade.
+            model_type: The type of ML model to use (e.g., "lstm", "xgboost").
+            user_id: The ID of the user initiating the trades.
+            confidence_threshold: Minimum model confidence to execute each trade.
+            risk_per_trade: Risk percentage for position sizing.
+
+        Returns:
+            A dictionary mapping each symbol to its execute_trade result.
+        """
+        symbols = list(dict.fromkeys(symbols))
+        portfolio_value_future = _alpaca_executor.submit(self.get_portfolio_value)
+        cached_predictions = self._get_cached_predictions(symbols, model_type)
+        prices = self.get_latest_prices(symbols)
+        portfolio_value = portfolio_value_future.result()
+        results = {
+            symbol: self.execute_trade(
+                db, symbol, model_type, user_id,
+                confidence_threshold=confidence_threshold,
+                risk_per_trade=risk_per_trade,
+                current_price=prices.get(symbol),
+                portfolio_value=portfolio_value,
+                prediction_data=cached_predictions.get(symbol),
+                commit=False,
+            )
+            for symbol in symbols
+        }
+        try:
+            db.commit()
+        except Exception as e: # The orders were placed; only their log rows are lost
+            logger.error(f"Database error committing {len(symbols)} trade logs: {e}")
+            db.rollback()
+            for result in results.values():
+                if result["status"] == "success":
+                    result["status"] = "error"
+                    result["message"] = f"DB error: {e}"
+                    result.pop("trade_log_id", None)
+        return results
+
+    def _get_cached_predictions(self, symbols: List[str], model_type: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Reads the cached predictions for all symbols: the in-process cache first, then one MGET for the rest.
+        Misses and undecodable entries are omitted.
+        """
+        predictions: Dict[str, Dict[str, Any]] = {}
+        for symbol in symbols:
+            local_prediction = _get_local_prediction(_prediction_cache_key(symbol, model_type))
+            if local_prediction is not None:
+                predictions[symbol] = local_prediction
+        remaining = [symbol for symbol in symbols if symbol not in predictions]
+        if not r or not remaining:
+            return predictions
+        try:
+            cached_values = r.mget([_prediction_cache_key(symbol, model_type) for symbol in remaining])
+        except RedisError as e:
+            logger.warning(f"Redis error getting cached predictions for {len(remaining)} symbols: {e}")
+            return predictions
+        for symbol, cached_value in zip(remaining, cached_values):
+            if not cached_value:
+                continue
+            cache_key = _prediction_cache_key(symbol, model_type)
+            try:
+                predictions[symbol] = orjson.loads(cached_value)
+            except orjson.JSONDecodeError as e:
+                logger.warning(f"Failed to decode cached JSON for {cache_key}: {e}. Fetching new prediction.")
+                continue
+            _set_local_prediction(cache_key, predictions[symbol])
+        return predictions
+
     def get_trade_history(self, days: int = 30) -> List[Dict[str, Any]]:
         """
         Retrieves trade history (filled orders) from Alpaca for a specified number of past days.
@@ -345,7 +617,7 @@ class TradingService:
         try:
             # Alpaca API expects 'after' or 'until' for date filtering of activities.
             # Using 'after' to get activities since N days ago.
-            after_date = (datetime.now() - timedelta(days=days)).isoformat()
+            after_date = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat() # Explicit offset, not server-local time
             activities = self.api.get_activities(activity_types="FILL", after=after_date, direction="desc")
             
             return [{
@@ -394,7 +666,6 @@ class TradingService:
 
             y_actual_slice = y[-test_data_points:]
             X_test_slice = X[-test_data_points:]
-            y_pred_list = []
 
             # TODO: Consider if MLEngine should have a more public method for loading models for backtesting
             # to avoid using '_load_..._model' if they are intended as private.
@@ -403,9 +674,11 @@ class TradingService:
                 if not model:
                     logger.error(f"Failed to load LSTM model for {symbol} during backtest.")
                     return None
-                for x_instance in X_test_slice:
-                    pred = model.predict(np.expand_dims(x_instance, axis=0))[0]
-                    y_pred_list.append(pred[0] if isinstance(pred, (list, np.ndarray)) else pred)
+                # One batched forward pass over all test sequences instead of one call per sequence; calling the
+                # model directly skips predict()'s per-call dataset/callback setup, which dominates for one batch.
+                # Keep the first output of each prediction, as the per-sequence version did.
+                preds = np.asarray(model(np.asarray(X_test_slice, dtype=np.float32), training=False))
+                y_pred_list = preds.reshape(len(X_test_slice), -1)[:, 0]
             elif model_type == "xgboost":
                 model = ml_engine._load_xgboost_model(symbol) #
                 if not model:
@@ -420,48 +693,43 @@ class TradingService:
                 # This implies X_test_slice might need similar reshaping.
                 # Let's assume predict method of xgboost model in ml_engine handles the shape or
                 # prepare_data already provides a 2D suitable X for xgboost if model_type='xgboost'
-                for x_instance in X_test_slice:
-                    # Reshape if necessary, matching the training input shape for XGBoost
-                    # If X_test_slice is (test_data_points, lookback, num_features)
-                    # and XGBoost expects (test_data_points, lookback * num_features)
-                    reshaped_x_instance = x_instance.reshape(1, -1) # Flatten each sequence for XGBoost
-                    pred = model.predict(reshaped_x_instance)[0]
-                    y_pred_list.append(pred)
+                # Reshape if necessary, matching the training input shape for XGBoost
+                # If X_test_slice is (test_data_points, lookback, num_features)
+                # and XGBoost expects (test_data_points, lookback * num_features)
+                # Flatten each sequence for XGBoost, as one contiguous float32 block (XGBoost's native precision),
+                # so building its input matrix is a single copy rather than a conversion of float64 rows
+                reshaped_X = np.ascontiguousarray(X_test_slice.reshape(X_test_slice.shape[0], -1), dtype=np.float32)
+                y_pred_list = model.predict(reshaped_X) # One batched predict over all test sequences
             else:
                 logger.error(f"Unsupported model_type for backtesting: {model_type}")
                 return None
 
-            df_bt = pd.DataFrame({"actual_price": y_actual_slice, "predicted_price_signal": y_pred_list})
-            
+            y_actual = np.asarray(y_actual_slice, dtype=float)
+            y_pred = np.asarray(y_pred_list, dtype=float)
+
             # Calculate directional accuracy (simple example)
-            # Assumes y_actual_slice and y_pred_list are next-period price predictions
-            df_bt["actual_direction"] = np.sign(df_bt["actual_price"].diff().fillna(0))
-            # Predicted direction based on whether predicted price is > or < current actual (or previous predicted)
-            # This part needs careful thought: what is the baseline for predicted direction?
-            # If y_pred_list are price predictions, compare to previous actual or a neutral point.
-            # For simplicity, let's assume prediction is change from previous actual or a signal strength.
-            # The original code compared diffs of actual vs diffs of predicted - this is better.
-            # Let's make predicted_price_signal the actual predicted price for next step for consistency.
-            df_bt["predicted_direction_from_signal"] = np.sign(df_bt["predicted_price_signal"].diff().fillna(0))
-
-
-            # Match direction of change from previous day
-            actual_price_changes = df_bt["actual_price"].diff().fillna(0)
-            predicted_price_changes = df_bt["predicted_price_signal"].diff().fillna(0) # Assuming y_pred_list are target prices
-
-            df_bt["direction_match"] = (np.sign(actual_price_changes) == np.sign(predicted_price_changes)) & (np.sign(actual_price_changes) != 0)
-            
-            accuracy = df_bt["direction_match"].mean() if not df_bt.empty else 0.0
-            
+            # Assumes y_actual_slice and y_pred_list are next-period price predictions: match the direction of
+            # change from the previous step of actual vs predicted prices. The first step has no previous one
+            # (change 0, as with the former diff().fillna(0)), so it never counts as a match.
+            actual_direction = np.sign(np.diff(y_actual, prepend=y_actual[:1]))
+            predicted_direction = np.sign(np.diff(y_pred, prepend=y_pred[:1]))
+            direction_match = (actual_direction == predicted_direction) & (actual_direction != 0)
+
+            accuracy = float(direction_match.mean()) if direction_match.size else 0.0
+
             logger.info(f"Backtest for {symbol} ({model_type}) completed. Directional accuracy: {accuracy:.2%}")
-            
+
             # Return limited results to avoid large data transfer if this is an API endpoint
+            summary = slice(-5, None)
             return {
                 "symbol": symbol,
                 "model_type": model_type,
                 "directional_accuracy": accuracy,
-                "results_summary": df_bt[["actual_price", "predicted_price_signal", "direction_match"]].tail().to_dict('records') # Example summary
-                # "full_results_df_json": df_bt.to_json(orient="split") # Optionally return full df
+                "results_summary": pd.DataFrame({ # Example summary: only the last few rows are ever built
+                    "actual_price": y_actual[summary],
+                    "predicted_price_signal": y_pred[summary],
+                    "direction_match": direction_match[summary],
+                }).to_dict('records')
             }
         except Exception as e:
             logger.error(f"Error during backtest for {symbol} ({model_type}): {e}", exc_info=True)
@@ -0,0 +1,248 @@
+from datetime import date, datetime, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.models import FinancialReport, FinancialStatementType, TimeframeType
+from app.services import financial_data_service as fds
+from app.services.financial_data_service import FinancialDataService
+
+
+# --- Latest statement per type (ROW_NUMBER window) ---
+
+@pytest.fixture
+def db_session():
+    engine = create_engine("sqlite://")
+    FinancialReport.__table__.create(engine)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+def _report(symbol, report_type, timeframe, period_end, marker):
+    return FinancialReport(
+        company_profile_id=1,
+        symbol=symbol,
+        report_type=report_type,
+        timeframe=timeframe,
+        fiscal_year=period_end.year,
+        fiscal_period="FY" if timeframe == TimeframeType.ANNUAL else "Q2",
+        filing_date=period_end,
+        period_of_report_date=period_end,
+        data={"marker": marker},
+    )
+
+
+def test_latest_financial_statements_picks_latest_row_per_type(db_session):
+    income, balance = FinancialStatementType.INCOME_STATEMENT, FinancialStatementType.BALANCE_SHEET
+    annual, quarterly = TimeframeType.ANNUAL, TimeframeType.QUARTERLY
+    db_session.add_all([
+        _report("AAPL", income, annual, date(2021, 9, 30), "income-2021"),
+        _report("AAPL", income, annual, date(2023, 9, 30), "income-2023"),
+        _report("AAPL", income, annual, date(2022, 9, 30), "income-2022"),
+        _report("AAPL", income, annual, date(2024, 9, 30), "income-2024"), # After the effective date
+        _report("AAPL", income, quarterly, date(2023, 12, 30), "income-q"), # Other timeframe
+        # Balance sheets filed less often: the latest one is older than the latest income statement
+        _report("AAPL", balance, annual, date(2020, 9, 30), "balance-2020"),
+        _report("AAPL", balance, annual, date(2022, 9, 30), "balance-2022"),
+        _report("MSFT", balance, annual, date(2023, 6, 30), "msft-balance"), # Other symbol
+    ])
+    db_session.commit()
+    service = FinancialDataService(db_session=db_session)
+
+    latest = service._get_latest_financial_statements(
+        "AAPL", (income, balance, FinancialStatementType.CASH_FLOW_STATEMENT), annual, date(2023, 12, 31)
+    )
+
+    assert {report_type: report.data["marker"] for report_type, report in latest.items()} == {
+        income: "income-2023",
+        balance: "balance-2022",
+    }
+
+
+def test_latest_financial_statements_empty_when_nothing_on_or_before_date(db_session):
+    db_session.add(_report("AAPL", FinancialStatementType.INCOME_STATEMENT, TimeframeType.ANNUAL, date(2024, 9, 30), "income-2024"))
+    db_session.commit()
+    service = FinancialDataService(db_session=db_session)
+
+    assert service._get_latest_financial_statements(
+        "AAPL", (FinancialStatementType.INCOME_STATEMENT,), TimeframeType.ANNUAL, date(2023, 12, 31)
+    ) == {}
+
+
+# --- Report validation (fresh fetches) vs trusted cache payloads ---
+
+_MAPPED_REPORT = {
+    "filing_date": date(2023, 11, 3), "start_date": date(2022, 9, 25), "end_date": date(2023, 9, 30),
+    "fiscal_year": "2023", "fiscal_period": "FY", "timeframe": "annual",
+    "source_filing_url": "https://api.polygon.io/v1/reference/sec/filings/0000320193-23-000106",
+    "source_filing_file_url": None, "acceptance_datetime": "20231102180000",
+    "financials": {"income_statement": {"revenues": 383285000000.0}, "balance_sheet": {"assets": 352583000000.0}},
+}
+
+
+def test_validated_report_dict_coerces_fields():
+    report = FinancialDataService(db_session=None)._validated_report_dict("aapl", _MAPPED_REPORT)
+
+    assert report["fiscal_year"] == 2023
+    assert report["source_filing_url"] == _MAPPED_REPORT["source_filing_url"]
+    assert type(report["source_filing_url"]) is str
+    assert report["financials"] is _MAPPED_REPORT["financials"]
+
+
+@pytest.mark.parametrize("override", [{"filing_date": None}, {"fiscal_year": "FY2023"}, {"timeframe": "weekly"}])
+def test_validated_report_dict_rejects_invalid_reports(override):
+    with pytest.raises(ValueError):
+        FinancialDataService(db_session=None)._validated_report_dict("AAPL", {**_MAPPED_REPORT, **override})
+
+
+def test_report_rows_validated_unless_from_cache():
+    service = FinancialDataService(db_session=None)
+    now_utc = datetime(2024, 1, 2, tzinfo=timezone.utc)
+    bad_report = {**_MAPPED_REPORT, "fiscal_year": "FY2023"}
+
+    fresh_rows = list(service._iter_financial_report_rows("AAPL", 1, [bad_report, _MAPPED_REPORT], now_utc))
+    cached = service._validated_report_dict("AAPL", _MAPPED_REPORT)
+    cached_rows = list(service._iter_financial_report_rows("AAPL", 1, [cached], now_utc, from_cache=True))
+
+    # The malformed report is skipped; the valid one yields a row per statement present
+    assert [row["report_type"] for row in fresh_rows] == [FinancialStatementType.INCOME_STATEMENT, FinancialStatementType.BALANCE_SHEET]
+    assert fresh_rows == cached_rows
+    assert fresh_rows[0]["fiscal_year"] == 2023
+
+
+# --- Key ratio arithmetic ---
+
+_COMPLETE_INPUTS = {
+    "price": 100.0, "shares_outstanding": 10.0, "eps": 5.0, "revenue": 500.0, "net_income": 50.0,
+    "gross_profit": 200.0, "operating_income": 100.0, "total_liabilities": 300.0, "total_equity": 250.0,
+    "current_assets": 400.0, "current_liabilities": 200.0, "inventory": 100.0,
+}
+
+
+def test_compute_ratios_complete_inputs():
+    ratios = fds._compute_ratios(_COMPLETE_INPUTS)
+
+    assert ratios.pop("dividend_yield") is None # Needs dividend data; never computed from financials
+    assert ratios == pytest.approx({
+        "price_to_earnings_ratio": 20.0,
+        "price_to_sales_ratio": 2.0,
+        "price_to_book_ratio": 4.0,
+        "earnings_per_share": 5.0,
+        "return_on_equity": 0.2,
+        "debt_to_equity_ratio": 1.2,
+        "current_ratio": 2.0,
+        "quick_ratio": 1.5,
+        "gross_profit_margin": 0.4,
+        "operating_profit_margin": 0.2,
+        "net_profit_margin": 0.1,
+    })
+
+
+def test_compute_ratios_zero_denominators_and_missing_inputs_are_none():
+    ratios = fds._compute_ratios({**_COMPLETE_INPUTS, "total_equity": 0.0, "revenue": None, "price": 0.0})
+
+    # Zero equity: masked division, not inf
+    assert ratios["return_on_equity"] is None
+    assert ratios["debt_to_equity_ratio"] is None
+    # Missing revenue
+    assert ratios["gross_profit_margin"] is None
+    assert ratios["net_profit_margin"] is None
+    # Zero price means "unavailable"
+    assert ratios["price_to_earnings_ratio"] is None
+    assert ratios["price_to_book_ratio"] is None
+    # Unaffected ratios are still computed
+    assert ratios["current_ratio"] == pytest.approx(2.0)
+
+
+def test_compute_ratios_non_finite_results_are_none():
+    ratios = fds._compute_ratios({**_COMPLETE_INPUTS, "price": 1e308, "shares_outstanding": 1e308})
+
+    assert ratios["price_to_sales_ratio"] is None # market cap overflows to inf
+    assert ratios["price_to_book_ratio"] is None
+    assert ratios["net_profit_margin"] == pytest.approx(0.1)
+
+
+def test_compute_ratios_batch_rows_are_independent():
+    rows = fds._compute_ratios_batch([_COMPLETE_INPUTS, {"eps": "n/a"}, {}])
+
+    assert rows[0]["price_to_earnings_ratio"] == pytest.approx(20.0)
+    assert all(value is None for value in rows[1].values())
+    assert all(value is None for value in rows[2].values())
+
+
+# --- Cache codec ---
+
+def test_cache_codec_round_trips_dates_and_datetimes_uncompressed():
+    payload = {
+        "symbol": "AAPL",
+        "list_date": date(1980, 12, 12),
+        "last_refreshed": datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+        "market_cap": 2.8e12,
+        "keys": ["a", "b"],
+    }
+
+    packed = fds._pack_cache_payload(payload)
+
+    assert len(packed) < fds._ZSTD_MIN_BYTES
+    assert not packed.startswith(fds._ZSTD_MAGIC)
+    unpacked = fds._unpack_cache_payload(packed)
+    assert unpacked == payload
+    assert type(unpacked["list_date"]) is date
+
+
+def test_cache_codec_round_trips_compressed_payloads():
+    payload = [
+        {"end_date": date(2000 + i, 12, 31), "financials": {"income_statement": {"revenues": float(i) * 1e9}}}
+        for i in range(100)
+    ]
+
+    packed = fds._pack_cache_payload(payload)
+
+    assert packed.startswith(fds._ZSTD_MAGIC)
+    assert fds._unpack_cache_payload(packed) == payload
+
+
+def test_cache_codec_miss_sentinel():
+    value = fds._unpack_cache_payload(fds._MISS_SENTINEL)
+
+    assert value is fds._MISS
+    assert not value
+
+
+class _FakeRedis:
+    def __init__(self, values):
+        self.values = values
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def mget(self, keys):
+        return [self.values.get(key) for key in keys]
+
+
+@pytest.fixture
+def no_l1_cache(monkeypatch):
+    monkeypatch.setattr(settings, "ENABLE_L1_CACHE", False)
+
+
+def test_cache_reads_surface_sentinel_and_payloads(no_l1_cache):
+    service = FinancialDataService(db_session=None, redis_client=_FakeRedis({
+        "miss": fds._MISS_SENTINEL,
+        "hit": fds._pack_cache_payload({"a": 1}),
+    }))
+
+    assert service._get_from_cache("miss") is fds._MISS
+    assert service._get_from_cache("hit") == {"a": 1}
+    assert service._get_many_from_cache(["miss", "hit", "absent"]) == {"miss": fds._MISS, "hit": {"a": 1}}
+
+
+def test_cache_reads_from_str_client_are_misses(no_l1_cache):
+    # A decode_responses=True client returns str: treated as a cache miss, not an error
+    service = FinancialDataService(db_session=None, redis_client=_FakeRedis({"miss": "__MISS__", "hit": "\x81\xa1a\x01"}))
+
+    assert service._get_from_cache("miss") is None
+    assert service._get_from_cache("hit") is None
+    assert service._get_many_from_cache(["miss", "hit"]) == {}